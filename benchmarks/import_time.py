@@ -0,0 +1,105 @@
+"""Measures the startup time of `import discqua` and guards it against regressions.
+
+Each run imports discqua in a fresh interpreter. The script fails if a heavy dependency
+is loaded at import time, or if the median import time exceeds --max-seconds.
+
+    python benchmarks/import_time.py --runs 5 --max-seconds 0.5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = (
+    "openai",
+    "convokit",
+    "spacy",
+    "nltk",
+    "numpy",
+    "pandas",
+    "matplotlib",
+    "torch",
+    "transformers",
+    "llama_cpp",
+)
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import discqua
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(elapsed)
+print(",".join(heavy))
+"""
+
+
+def _env():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    return env
+
+
+def measure(runs):
+    times, heavy = [], set()
+    probe = PROBE.format(heavy=HEAVY_MODULES)
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", probe],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=_env(),
+        ).stdout.splitlines()
+        times.append(float(out[0]))
+        heavy.update(m for m in out[1].split(",") if m)
+    return times, sorted(heavy)
+
+
+def slowest_imports(top):
+    # -X importtime writes "import time: self [us] | cumulative | imported package"
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import discqua"],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=_env(),
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        rows.append((int(parts[1]), parts[2].rstrip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=0.5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    times, heavy = measure(args.runs)
+    median = statistics.median(times)
+    print(f"import discqua: median {median:.3f}s over {args.runs} runs")
+    print("slowest imports (cumulative us):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"  {cumulative:>10}  {name.strip()}")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules loaded at import time: {', '.join(heavy)}")
+        failed = True
+    if median > args.max_seconds:
+        print(f"FAIL: median import time above {args.max_seconds:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,14 @@ from .dispute_tactics import dispute_tactics
 from .diversity import diversity_disc, diversity_response, ngramdiversity
 from .empathy import empathy
 from .engagement import engagement_disc, engagement_response, reciprocity
+from .evaluation import evaluate, evaluate_corpus
+from .fused import fused_metrics
 from .informativeness import informativeness_disc, informativeness_response
 from .persuasiveness import persuasion_strategy, persuasiveness_disc
 from .politeness import politeness, politeness_ngrams
 from .powerstatus_socialbias import coordination, social_bias
-from .readability import readability
+from .readability import readability, readability_bulk
 from .sentiment_analysis import sentiment
+from .streaming import DiscussionSession
 from .toxicity import toxicity
 from .turnTaking import make_visualization, participation
@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
-from tqdm import tqdm
-
-from discqua.utils import dprint, prompt_gpt4
+from discqua.utils import OutputSpec, dprint, prompt_batch, static_prefix
 
 #######################################################################################################################################
 ini = """Below is given a set of definitions of various argument quality dimensions."""
@@ -152,6 +150,14 @@ dialectic_output_format = """
 """
 
 
+output_specs = {
+    "logic": OutputSpec.labels(4),
+    "rhetoric": OutputSpec.labels(6),
+    "dialectic": OutputSpec.labels(4),
+    "overall": OutputSpec.label(),
+}
+
+
 class AQualityDimensions:
     def __init__(
         self, utterances, conv_topic, openaiKey, model_type, llm, ctx, dimension
@@ -178,11 +184,9 @@ class AQualityDimensions:
             dprint("error", "No matching dimension")
             return []
         # prompt = ini + Argument_quality_dimensions + final
-        annotations_ci = []
+        prompts = []
         #
-        for index, utt in enumerate(
-            tqdm(self.utterances, desc="Processing utterances")
-        ):
+        for index, utt in enumerate(self.utterances):
             conv_hist = ""
             text = utt.text
             speaker = utt.get_speaker().id
@@ -200,12 +204,17 @@ class AQualityDimensions:
                     conv_history=conv_hist,
                     post=self.conv_topic,
                 )
-                response_text = prompt_gpt4(
-                    formatted_prompt, self.openaiKey, self.model_type, self.llm
-                )
                 # print(formatted_prompt)
-                annotations_ci.append(response_text)
+                prompts.append(formatted_prompt)
             except Exception as e:
                 print("Error: ", e)
-                annotations_ci.append(-1)
+                prompts.append(None)
+        annotations_ci = prompt_batch(
+            prompts,
+            self.openaiKey,
+            self.model_type,
+            self.llm,
+            output=output_specs[self.dimension],
+            prefix=static_prefix(prompt),
+        )
         return annotations_ci
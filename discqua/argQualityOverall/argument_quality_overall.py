@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from discqua.utils import prompt_gpt4
+from discqua.utils import prompt_gpt4, score_labels
 
 #################################################################################
 
@@ -30,15 +30,29 @@ Please, ensure that your last statement is the label in brackets [].
 
 """
 
+answer_prefix = "The average overall quality of the arguments presented in the above discussion is: ["
+
+rating_labels = ["1", "2", "3"]
+
 
 class OAQuality:
-    def __init__(self, utterances, conv_topic, openaiKey, mode, model_type, llm):
+    def __init__(
+        self,
+        utterances,
+        conv_topic,
+        openaiKey,
+        mode,
+        model_type,
+        llm,
+        scoring="generate",
+    ):
         self.utterances = utterances
         self.conv_topic = conv_topic
         self.openaiKey = openaiKey
         self.mode = mode
         self.model_type = model_type
         self.llm = llm
+        self.scoring = scoring
 
     def calculate_ovargquality_scores(self):
         mode_prompt = self.mode
@@ -57,6 +71,10 @@ class OAQuality:
             formatted_prompt = prompt_realnumber.format(
                 conv_text=conv_text, post=self.conv_topic
             )
+        if mode_prompt == "rating" and self.scoring == "logits":
+            return score_labels(
+                [formatted_prompt], self.llm, answer_prefix, rating_labels
+            )
         annotations_ci = []
         try:
             response_text = prompt_gpt4(
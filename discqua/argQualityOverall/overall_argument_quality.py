@@ -7,6 +7,7 @@ from discqua.utils import (
     isValidResponse,
     save_dict_2_json,
     validateInputParams,
+    validateScoring,
 )
 
 from .argument_quality_overall import OAQuality
@@ -23,6 +24,8 @@ def overall_arg_quality(
     mode="real",
     gpu=False,
     device="auto",
+    scoring="generate",
+    return_expected=False,
 ):
     """Calculates the overall argument quality score for a given discussion using a specified language model.
 
@@ -37,12 +40,16 @@ def overall_arg_quality(
         mode (str): "rating" for a rating label or "real" for a real score. Defaults to "real".
         gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
         device(str): The device to load the model on. If None, the device will be inferred. Defaults to auto.
+        scoring (str): "generate" to decode the answer, or "logits" to score the candidate labels with a single forward pass, for mode "rating" and transformers models only. Defaults to "generate".
+        return_expected (bool): If True, the expected value of the label under the label probabilities is returned as well, for scoring "logits" only. Defaults to False.
 
     Returns:
         dict: A dictionary mapping the discussion ID to its overall argument quality score.
+        If return_expected is True, a tuple of this dictionary and the dictionary mapping the discussion ID to the expected label value.
     """
 
     validateInputParams(model_type, openAIKEY, model_path)
+    validateScoring(scoring, model_type)
     dprint("info", f"Building corpus of: {len(message_list)} utterances ")
     timestr = time.strftime("%Y%m%d-%H%M%S")
     llm = None
@@ -61,7 +68,9 @@ def overall_arg_quality(
     dprint(
         "info", f"Overall Argument Quality-Proccessing discussion: {disc_id} with LLM "
     )
-    ovargqual = OAQuality(utterances, conv_topic, openAIKEY, mode, model_type, llm)
+    ovargqual = OAQuality(
+        utterances, conv_topic, openAIKEY, mode, model_type, llm, scoring
+    )
     ovargument_quality_scores_features = ovargqual.calculate_ovargquality_scores()
     ovargquality_scores_llm_output_dict[disc_id] = ovargument_quality_scores_features
     #
@@ -78,6 +87,7 @@ def overall_arg_quality(
     """
 
     oaq_dim_per_disc = {}
+    expected_per_disc = {}
     for disc_id, turnAnnotations in ovargquality_scores_llm_output_dict.items():
         for label in turnAnnotations:
             if label == -1:
@@ -87,6 +97,9 @@ def overall_arg_quality(
                 )
                 dprint("info", label)
                 continue
+            if isinstance(label, dict):
+                expected_per_disc[disc_id] = label["expected"]
+                label = label["response"]
             parts = label.split(
                 "average overall quality of the arguments presented in the above discussion is:"
             )
@@ -101,5 +114,11 @@ def overall_arg_quality(
 
             oaq_dim_per_disc[disc_id] = value
 
+    if expected_per_disc:
+        save_dict_2_json(
+            expected_per_disc, "ovrall_argqual_expected_per_disc", disc_id, timestr
+        )
     save_dict_2_json(oaq_dim_per_disc, "ovrall_argqual_per_disc", disc_id, timestr)
+    if return_expected:
+        return oaq_dim_per_disc, expected_per_disc
     return oaq_dim_per_disc
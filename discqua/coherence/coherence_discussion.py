@@ -2,6 +2,7 @@
 import time
 
 from discqua.utils import (
+    OutputSpec,
     dprint,
     getModel,
     getUtterances,
@@ -24,6 +25,9 @@ Please, ensure that your last statement is the score in brackets [].
 """
 
 
+output_spec = OutputSpec.label()
+
+
 def calculate_discussion_coherence_score(utts, topic, key, model_type, model):
     conv_text = ""
     for utt in utts:
@@ -33,7 +37,9 @@ def calculate_discussion_coherence_score(utts, topic, key, model_type, model):
         formatted_prompt = prompt.format(conv_text=conv_text, post=topic)
     annotations_ci = []
     try:
-        response_text = prompt_gpt4(formatted_prompt, key, model_type, model)
+        response_text = prompt_gpt4(
+            formatted_prompt, key, model_type, model, output=output_spec
+        )
         # print(formatted_prompt)
         annotations_ci.append(response_text)
     except Exception as e:
@@ -1,17 +1,18 @@
 # -*- coding: utf-8 -*-
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     getModel,
     getUtterances,
     isValidResponse,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
+    score_labels,
     sleep,
     validateInputParams,
+    validateScoring,
 )
 
 prompt = """\n\n
@@ -35,9 +36,18 @@ Please, ensure that your last statement is the score in brackets [].
 """
 
 
-def calculate_response_coherence_score(utts, topic, openAIKEY, model_type, model, ctx):
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+output_spec = OutputSpec.label()
+
+answer_prefix = "The coherence of the new response is: ["
+
+rating_labels = ["1", "2", "3", "4", "5"]
+
+
+def calculate_response_coherence_score(
+    utts, topic, openAIKEY, model_type, model, ctx, scoring="generate"
+):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -56,12 +66,16 @@ def calculate_response_coherence_score(utts, topic, openAIKEY, model_type, model
                 conv_history=conv_hist,
                 post=topic,
             )
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
             # print(formatted_prompt)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    if scoring == "logits":
+        return score_labels(prompts, model, answer_prefix, rating_labels)
+    annotations_ci = prompt_batch(
+        prompts, openAIKEY, model_type, model, output=output_spec
+    )
     return annotations_ci
 
 
@@ -77,6 +91,8 @@ def coherence_response(
     gpu=False,
     ctx=1,
     device="auto",
+    scoring="generate",
+    return_expected=False,
 ):
     """Calculates coherence scores for each response in a conversation using a specified language model.
 
@@ -92,12 +108,16 @@ def coherence_response(
         gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
         ctx (int): Number of previous utterances to include as context for each input. Defaults to 1.
         device(str): The device to load the model on. If None, the device will be inferred. Defaults to auto.
+        scoring (str): "generate" to decode the answer, or "logits" to score the candidate labels with a single forward pass, for transformers models only. Defaults to "generate".
+        return_expected (bool): If True, the expected value of the label of each utterance under the label probabilities is returned as well, for scoring "logits" only. Defaults to False.
 
     Returns:
        dict: A nested dictionary containing per-utterance coherence ratings for the given discussion ID.
+        If return_expected is True, a tuple of this dictionary and the dictionary mapping the discussion ID to the expected label value of each message ID.
     """
 
     validateInputParams(model_type, openAIKEY, model_path, message_list, msgsid_list)
+    validateScoring(scoring, model_type)
 
     dprint("info", f"Building corpus of: {len(message_list)} utterances")
     timestr = time.strftime("%Y%m%d-%H%M%S")
@@ -118,7 +138,7 @@ def coherence_response(
             f"Coherence Score Per Response-Proccessing discussion: {disc_id} with LLM",
         )
         coh_per_resp = calculate_response_coherence_score(
-            utterances, conv_topic, openAIKEY, model_type, llm, ctx
+            utterances, conv_topic, openAIKEY, model_type, llm, ctx, scoring
         )
         coh_per_resp_scores_llm_output_dict[disc_id] = coh_per_resp
         sleep(model_type)
@@ -140,6 +160,7 @@ def coherence_response(
     """
 
     coherence_scores_per_response = {}
+    expected_per_response = {}
     for disc_id, turnAnnotations in coh_per_resp_scores_llm_output_dict.items():
         counter = 0
         ut_dict = {}
@@ -152,6 +173,9 @@ def coherence_response(
                 dprint("info", label)
                 counter += 1
                 continue
+            if isinstance(label, dict):
+                expected_per_response[str(msgsid_list[counter])] = label["expected"]
+                label = label["response"]
             parts = label.split("coherence of the new response is:")
 
             value = isValidResponse(parts)
@@ -168,7 +192,16 @@ def coherence_response(
             counter += 1
         coherence_scores_per_response[disc_id] = ut_dict
 
+    if expected_per_response:
+        save_dict_2_json(
+            {disc_id: expected_per_response},
+            "coherence_expected_per_response",
+            disc_id,
+            timestr,
+        )
     save_dict_2_json(
         coherence_scores_per_response, "coherence_per_response", disc_id, timestr
     )
+    if return_expected:
+        return coherence_scores_per_response, {disc_id: expected_per_response}
     return coherence_scores_per_response
@@ -1,8 +1,6 @@
 import sys
 import time
 
-import pandas as pd
-
 from discqua.utils import getUtterances, save_dict_2_json
 
 from .collaboration_utility import CollaborationUtility
@@ -22,6 +20,8 @@ def collaboration(message_list, speakers_list, msgsid_list, disc_id, discussion_
         Each dictionary maps a discussion ID to its corresponding set of collaboration
         feature scores (aggregated if discussion-level, otherwise per-utterance).
     """
+    import pandas as pd
+
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
@@ -2,7 +2,7 @@ import os
 import re
 from collections import defaultdict
 
-import nltk
+from discqua.utils import get_parse_store
 
 from .stopwords import stopwords as mallet_stopwords
 
@@ -13,19 +13,84 @@ class Lexicon(object):
         self.regex = {
             cat: self.wordlist_to_re(wordlist) for cat, wordlist in wordlists.items()
         }
+        self.trie = self.wordlists_to_trie(wordlists)
 
     def wordlist_to_re(self, wordlist):
         return re.compile(r"\b(?:{})\b".format("|".join(wordlist).lower()))
 
+    def wordlists_to_trie(self, wordlists):
+        # a character trie of the words of all categories. A word ends at a node holding,
+        # under the None key, its first position in the wordlist of each category, and "."
+        # matches any character, as in the alternation of wordlist_to_re
+        trie = {}
+        for cat, wordlist in wordlists.items():
+            for index, word in enumerate(wordlist):
+                node = trie
+                for ch in word.lower():
+                    node = node.setdefault(ch, {})
+                node.setdefault(None, {}).setdefault(cat, index)
+        return trie
+
     def count_words(self, text, return_match=False):
         text_ = text.lower()
-        match = {cat: reg.findall(text_) for cat, reg in self.regex.items()}
-        count = {cat: len(m) for cat, m in match.items()}
-
         if return_match:
+            match = {cat: reg.findall(text_) for cat, reg in self.regex.items()}
+            count = {cat: len(m) for cat, m in match.items()}
             return count, match
-        else:
-            return count
+        return self.scan(text_)
+
+    def scan(self, text_):
+        """Counts the words of each category in a single scan of the lowercased text. The
+        counts are those of the category regexes: at each word boundary, the first word of
+        the wordlist followed by a word boundary matches, and the matches of a category do
+        not overlap."""
+        count = dict.fromkeys(self.wordlists, 0)
+        # the position from which each category can match again
+        resume = dict.fromkeys(self.wordlists, 0)
+        trie = self.trie
+        size = len(text_)
+        previous_is_word = False
+        for start in range(size):
+            ch = text_[start]
+            is_word = ch.isalnum() or ch == "_"
+            at_boundary = is_word != previous_is_word
+            previous_is_word = is_word
+            if not at_boundary or (ch not in trie and "." not in trie):
+                continue
+            nodes = [trie]
+            best = {}
+            end = start
+            while nodes and end < size:
+                ch = text_[end]
+                end += 1
+                children = []
+                for node in nodes:
+                    child = node.get(ch)
+                    if child is not None:
+                        children.append(child)
+                    if ch != "." and ch != "\n":
+                        child = node.get(".")
+                        if child is not None:
+                            children.append(child)
+                nodes = children
+                if end < size:
+                    next_ch = text_[end]
+                    next_is_word = next_ch.isalnum() or next_ch == "_"
+                else:
+                    next_is_word = False
+                if next_is_word == (ch.isalnum() or ch == "_"):
+                    # no word boundary after the word
+                    continue
+                for node in nodes:
+                    for cat, index in node.get(None, {}).items():
+                        if resume[cat] <= start and (
+                            cat not in best or index < best[cat][0]
+                        ):
+                            best[cat] = (index, end)
+            for cat, (_, end) in best.items():
+                count[cat] += 1
+                resume[cat] = end
+        return count
 
 
 lexicons = {
@@ -105,24 +170,27 @@ lexicons = {
 }
 
 
-script_dir = os.path.dirname(__file__)  # Directory of the current script
-file_path = os.path.join(script_dir, "lexicons", "my_geo.txt")
-
-with open(os.path.join(script_dir, "lexicons", "my_geo.txt"), encoding="utf-8") as f:
-    lexicons["geo"] = [line.strip().lower() for line in f]
-
-with open(os.path.join(script_dir, "lexicons", "my_meta.txt"), encoding="utf-8") as f:
-    lexicons["meta"] = [line.strip().lower() for line in f]
+_LEX_MATCHER = None
 
-with open(
-    os.path.join(script_dir, "lexicons", "my_certain.txt"), encoding="utf-8"
-) as f:
-    lexicons["certain"] = [line.strip().lower() for line in f]
 
-with open(os.path.join(script_dir, "lexicons", "my_hedges.txt"), encoding="utf-8") as f:
-    lexicons["hedge"] = [line.strip().lower() for line in f]
+def get_lex_matcher():
+    """Returns the lexicon matcher, reading the lexicon files on first use."""
+    global _LEX_MATCHER
+    if _LEX_MATCHER is None:
+        script_dir = os.path.dirname(__file__)  # Directory of the current script
+        for category, name in (
+            ("geo", "my_geo.txt"),
+            ("meta", "my_meta.txt"),
+            ("certain", "my_certain.txt"),
+            ("hedge", "my_hedges.txt"),
+        ):
+            with open(
+                os.path.join(script_dir, "lexicons", name), encoding="utf-8"
+            ) as f:
+                lexicons[category] = [line.strip().lower() for line in f]
+        _LEX_MATCHER = Lexicon(lexicons)
+    return _LEX_MATCHER
 
-lex_matcher = Lexicon(lexicons)
 
 desired_tags = (
     "NN",
@@ -169,7 +237,7 @@ def message_features(reasons, stopwords=mallet_stopwords):
             where_introduced[w].append(("reason", k))
 
         features["n_words"] = len(tokens.split())
-        lex_counts = lex_matcher.count_words(tokens)
+        lex_counts = get_lex_matcher().count_words(tokens)
         features.update(lex_counts)
 
         features["n_introduced"] = len(content_words)
@@ -183,10 +251,44 @@ def message_features(reasons, stopwords=mallet_stopwords):
     return reason_features
 
 
-def deriving_collaboration_markers(utterance, speaker):
-    pos_tags = nltk.pos_tag(utterance.split())
+def _tagger_id():
+    # tags are stored per NLTK version, so that a new tagger tags the texts again
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return f"nltk.pos_tag=={version('nltk')}"
+    except PackageNotFoundError:
+        return "nltk.pos_tag"
+
+
+def pos_tags(utterances):
+    """Returns the NLTK POS tags of the whitespace-separated tokens of each utterance. If a
+    parse store is set with set_parse_store, the stored tags are reused and only the
+    remaining utterances are tagged."""
+    store = get_parse_store()
+    tagger_id = _tagger_id()
+    tags = (
+        store.get_many(tagger_id, utterances)
+        if store is not None
+        else [None] * len(utterances)
+    )
+    missing = [i for i, utt_tags in enumerate(tags) if utt_tags is None]
+    if missing:
+        import nltk
+
+        tagged = nltk.pos_tag_sents([utterances[i].split() for i in missing])
+        for i, sentence in zip(missing, tagged):
+            tags[i] = [tag for (_, tag) in sentence]
+        if store is not None:
+            store.put_many(tagger_id, [(utterances[i], tags[i]) for i in missing])
+    return tags
+
+
+def deriving_collaboration_markers(utterance, speaker, tags=None):
+    if tags is None:
+        tags = pos_tags([utterance])[0]
     tokens = utterance
-    tags = " ".join([tag for (_, tag) in pos_tags])
+    tags = " ".join(tags)
 
     test_reasons = [(speaker, tokens, tags)]  # Create the 'reason' structure
     reason_feat = message_features(test_reasons)
@@ -199,9 +301,11 @@ class CollaborationUtility:
 
     def calculate_collaboration_features(self):
         conv_dict = {}
-        for utt in self.utterances:
+        # the utterances are tagged at once, reusing the stored tags
+        tags = pos_tags([utt.text for utt in self.utterances])
+        for utt, utt_tags in zip(self.utterances, tags):
             text = utt.text
             speaker = utt.get_speaker().id
-            g = deriving_collaboration_markers(text, speaker)[0]
+            g = deriving_collaboration_markers(text, speaker, utt_tags)[0]
             conv_dict[utt.get_id()] = g
         return conv_dict
@@ -1,12 +1,157 @@
+import math
 import sys
 import time
 
-import numpy as np
+from tqdm import tqdm
 
-from discqua.utils import dprint, getModel, save_dict_2_json
+from discqua.utils import dprint, get_sentiment_cache, getModel, save_dict_2_json
 
+# maximum input length of the sentiment model, in tokens
+_MAX_LENGTH = 512
 
-def controversy(message_list, disc_id, msgsid_list, discussion_level, device="auto"):
+
+class RollingStd:
+    """Sample standard deviation (ddof=1) of a growing series of values, updated in O(1) per
+    value with Welford's algorithm. The standard deviation of a single value is 0."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        return self.std
+
+    @property
+    def std(self):
+        if self.n < 2:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.n - 1))
+
+
+def clean_utterance(utt):
+    if not isinstance(utt, str):
+        dprint("info", f"Found non string utterance, casting to string: {utt} ")
+        utt = str(utt)
+    return utt.replace("\r\n", " ").replace("\n", " ").rstrip().lstrip()
+
+
+def expected_stars(result_list):
+    """Returns the sentiment score of an utterance, the sum over the star labels of the
+    number of stars times the label probability, along with the products."""
+    product_list = []
+    for result in result_list:
+        star = int(result["label"][0])
+        prob = float(result["score"])
+        product = star * prob
+        product_list.append(product)
+    return sum(product_list), product_list
+
+
+def rolling_std(values):
+    """Returns the sample standard deviation of every prefix of `values`, in one pass."""
+    accumulator = RollingStd()
+    return [accumulator.add(float(value)) for value in values]
+
+
+def _classify(pipe, texts):
+    import torch
+
+    model = pipe.model
+    inputs = pipe.tokenizer(
+        texts,
+        return_tensors="pt",
+        padding=True,
+        truncation=True,
+        max_length=_MAX_LENGTH,
+    ).to(model.device)
+    with torch.no_grad():
+        probs = torch.softmax(model(**inputs).logits.float(), dim=-1)
+    labels = [model.config.id2label[j] for j in range(probs.shape[-1])]
+    return [
+        [{"label": label, "score": score} for label, score in zip(labels, row)]
+        for row in probs.tolist()
+    ]
+
+
+def score_sentiments(pipe, texts, batch_size=32):
+    """Classifies cleaned utterances with the controversy sentiment model, in batches.
+
+    The texts are sorted by length and split into buckets of `batch_size`, each padded to
+    its longest text and truncated to the maximum input length of the model, in tokens.
+    If a sentiment cache is set with set_sentiment_cache, cached texts are answered from
+    it and only the remaining texts are classified.
+
+    Args:
+        pipe: The sentiment pipeline, as returned by getModel with model_type "controversy".
+        texts (list[str]): The cleaned utterances.
+        batch_size (int): Number of utterances per forward pass. Defaults to 32.
+
+    Returns:
+        list: For each text, in the order of `texts`, the probability of each star label
+        (a list of {"label", "score"} dicts), or None if it could not be classified.
+    """
+    cache = get_sentiment_cache()
+    model_id = pipe.model.name_or_path
+    results = [None] * len(texts)
+    pending = []
+    for i, text in enumerate(texts):
+        cached = cache.get(model_id, text) if cache is not None else None
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+    pending.sort(key=lambda i: len(texts[i]))
+    batch_size = max(1, int(batch_size))
+    buckets = [
+        pending[start : start + batch_size]
+        for start in range(0, len(pending), batch_size)
+    ]
+    for bucket in tqdm(
+        buckets, desc="Scoring utterance batches", disable=len(buckets) < 2
+    ):
+        try:
+            outputs = _classify(pipe, [texts[i] for i in bucket])
+        except Exception as ex:
+            dprint(
+                "error", f"Batched sentiment scoring failed, scoring one by one: {ex}"
+            )
+            outputs = []
+            for i in bucket:
+                try:
+                    outputs.append(_classify(pipe, [texts[i]])[0])
+                except Exception as ex:
+                    print("Exception at atterance: ", texts[i])
+                    print(ex)
+                    outputs.append(None)
+        for i, result_list in zip(bucket, outputs):
+            results[i] = result_list
+            if cache is not None and result_list is not None:
+                cache.put(model_id, texts[i], result_list)
+    return results
+
+
+def sentiment_score(pipe, text):
+    """Returns the sentiment score of a cleaned utterance under the controversy pipeline."""
+    result_list = score_sentiments(pipe, [text], batch_size=1)[0]
+    if result_list is None:
+        raise ValueError(f"Sentiment scoring failed for utterance: {text}")
+    return expected_stars(result_list)[0]
+
+
+def controversy(
+    message_list,
+    disc_id,
+    msgsid_list,
+    discussion_level,
+    device="auto",
+    as_array=False,
+    batch_size=32,
+):
     """Evaluates the controversy of a discussion based on sentiment variability.
        Sentiment scores are computed using a pretrained multilingual sentiment analysis model.
        Variability is quantified using the sample standard deviation of the sentiment scores, either at the discussion or utterance level.
@@ -16,6 +161,8 @@ def controversy(message_list, disc_id, msgsid_list, discussion_level, device="au
         disc_id (str): Unique identifier for the discussion.
         msgsid_list (list[str]) : List of messages ids corresponding to each utterance.
         discussion_level (bool): A boolean flag; if True, the annotations are applied at the discussion level; otherwise at the utterance level.
+        as_array (bool): A boolean flag; if True, the utterance level series are returned as NumPy arrays in the order of the utterances, instead of dicts indexed by utterance window. Defaults to False.
+        batch_size (int): Number of utterances classified per forward pass of the sentiment model. Defaults to 32.
 
     Returns:
         - If discussion_level is True:
@@ -26,7 +173,10 @@ def controversy(message_list, disc_id, msgsid_list, discussion_level, device="au
                                                where keys are discussion IDs and values are dicts indexed
                                                by utterance window (e.g., "utt_[0:2]").
                 - dict[str, dict[str, float]]: Corresponding rolling standard deviation of the normalized sentiment scores.
+                  With as_array, the values are NumPy arrays of the rolling standard deviations.
     """
+    import numpy as np
+
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
@@ -42,10 +192,7 @@ def controversy(message_list, disc_id, msgsid_list, discussion_level, device="au
     #
     utterances = []
     for i, utt in enumerate(message_list):
-        if not isinstance(utt, str):
-            dprint("info", f"Found non string utterance, casting to string: {utt} ")
-            utt = str(utt)
-        utt = utt.replace("\r\n", " ").replace("\n", " ").rstrip().lstrip()
+        utt = clean_utterance(utt)
         # utterances.append((utt, f"conv_{disc_id}_utt_{i}"))
         utterances.append((utt, f"{msgsid_list[i]}"))
 
@@ -55,25 +202,16 @@ def controversy(message_list, disc_id, msgsid_list, discussion_level, device="au
     utt_labelprobproduct_iter_dict = {}
     utt_unnormalized_factor_iter_dict = {}
     utt_normalized_factor_iter_dict = {}
-    for utt in utterances:
-        try:
-            text_iter, id_iter = utt
-            if len(text_iter) > 512:
-                text_iter = text_iter[0:513]
-            result_list = pipe([text_iter], return_all_scores=True)[0]
-            utt_resultlist_iter_dict[id_iter] = result_list
-            product_list = []
-            for result in result_list:
-                star = int(result["label"][0])
-                prob = float(result["score"])
-                product = star * prob
-                product_list.append(product)
-            utt_labelprobproduct_iter_dict[id_iter] = product_list
-            sent_score = sum(product_list)
-            utt_unnormalized_factor_iter_dict[id_iter] = sent_score
-        except Exception as ex:
-            print("Exception at atterance: ", utt)
-            print(ex)
+    result_lists = score_sentiments(
+        pipe, [text_iter for text_iter, _ in utterances], batch_size
+    )
+    for (text_iter, id_iter), result_list in zip(utterances, result_lists):
+        if result_list is None:
+            continue
+        utt_resultlist_iter_dict[id_iter] = result_list
+        sent_score, product_list = expected_stars(result_list)
+        utt_labelprobproduct_iter_dict[id_iter] = product_list
+        utt_unnormalized_factor_iter_dict[id_iter] = sent_score
     disc_resultlist_dict[disc_id] = utt_resultlist_iter_dict
     disc_productlist_dict[disc_id] = utt_labelprobproduct_iter_dict
     #
@@ -126,59 +264,31 @@ def controversy(message_list, disc_id, msgsid_list, discussion_level, device="au
         )
         return controversy_per_disc_unorm, controversy_per_disc_norm
     else:
-
         controversy_perutt_unorm = {}
-
+        controversy_perutt_norm = {}
         for disc_id, sent_dict in unorm_disc_controversy_dict.items():
-            # utt_ids_sorted = sorted(
-            #    sent_dict.keys(), key=lambda x: int(x.split("_")[-1])
-            # )
             utt_ids_sorted = [key for key in sent_dict.keys()]
-            scores_sorted = [sent_dict[utt_id] for utt_id in utt_ids_sorted]
-            #
-            rolling_std_dict = {}
-            counter = 0
-            for i in range(len(scores_sorted)):
-                # key_iter = f"utt_[0:{i}]"
-                key_iter = f"[{utt_ids_sorted[0]}:{utt_ids_sorted[counter]}]"
-                counter += 1
-                if i == 0:
-                    rolling_std_dict[key_iter] = 0.0
-                else:
-                    rolling_std_dict[key_iter] = float(
-                        np.std(scores_sorted[: i + 1], ddof=1)
-                    )
-            controversy_perutt_unorm[disc_id] = rolling_std_dict
+            unorm_series = rolling_std(sent_dict.values())
+            norm_series = rolling_std(norm_disc_controversy_dict[disc_id].values())
+            keys_iter = [f"[{utt_ids_sorted[0]}:{utt_id}]" for utt_id in utt_ids_sorted]
+            controversy_perutt_unorm[disc_id] = dict(zip(keys_iter, unorm_series))
+            controversy_perutt_norm[disc_id] = dict(zip(keys_iter, norm_series))
 
         save_dict_2_json(
             controversy_perutt_unorm, "controversy_per_utt_unorm", disc_id, timestr
         )
-
-        controversy_perutt_norm = {}
-
-        for disc_id, sent_dict in norm_disc_controversy_dict.items():
-            # utt_ids_sorted = sorted(
-            #    sent_dict.keys(), key=lambda x: int(x.split("_")[-1])
-            # )
-            utt_ids_sorted = [key for key in sent_dict.keys()]
-            scores_sorted = [sent_dict[utt_id] for utt_id in utt_ids_sorted]
-            #
-            rolling_std_dict = {}
-            counter = 0
-            for i in range(len(scores_sorted)):
-                # key_iter = f"utt_[0:{i}]"
-                key_iter = f"[{utt_ids_sorted[0]}:{utt_ids_sorted[counter]}]"
-                counter += 1
-                if i == 0:
-                    rolling_std_dict[key_iter] = 0.0
-                else:
-                    rolling_std_dict[key_iter] = float(
-                        np.std(scores_sorted[: i + 1], ddof=1)
-                    )
-            controversy_perutt_norm[disc_id] = rolling_std_dict
-
         save_dict_2_json(
             controversy_perutt_norm, "controversy_per_utt_norm", disc_id, timestr
         )
-
+        if as_array:
+            return (
+                {
+                    key: np.fromiter(values.values(), dtype=float, count=len(values))
+                    for key, values in controversy_perutt_unorm.items()
+                },
+                {
+                    key: np.fromiter(values.values(), dtype=float, count=len(values))
+                    for key, values in controversy_perutt_norm.items()
+                },
+            )
         return controversy_perutt_unorm, controversy_perutt_norm
@@ -1,15 +1,15 @@
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     extractFeature,
     getModel,
     getUtterances,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
     sleep,
+    static_prefix,
     validateInputParams,
 )
 
@@ -63,11 +63,14 @@ For clarity, your response should succinctly be presented in a structured list f
 """
 
 
+output_spec = OutputSpec.labels(14)
+
+
 def calculate_speech_acts_labels(utts, topic, openAIKEY, model_type, model, ctx):
 
     prompt = ini + speech_act_labels + final
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -85,11 +88,18 @@ def calculate_speech_acts_labels(utts, topic, openAIKEY, model_type, model, ctx)
                 post=topic,
             )
             # print(formatted_prompt)
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    annotations_ci = prompt_batch(
+        prompts,
+        openAIKEY,
+        model_type,
+        model,
+        output=output_spec,
+        prefix=static_prefix(prompt),
+    )
     return annotations_ci
 
 
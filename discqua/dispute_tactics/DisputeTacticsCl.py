@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
-from tqdm import tqdm
-
-from discqua.utils import prompt_gpt4
+from discqua.utils import OutputSpec, prompt_batch, static_prefix
 
 ini = """Below are two sets of linguistic features for disagreement levels and non-disagreement labels."""
 
@@ -88,6 +86,9 @@ For clarity, your response should succinctly be presented in a structured list f
 """
 
 
+output_spec = OutputSpec.labels(18)
+
+
 class DisputeTactics:
     def __init__(self, utterances, conv_topic, openaiKey, model_type, llm, ctx):
         self.utterances = utterances
@@ -99,11 +100,9 @@ class DisputeTactics:
 
     def calculate_dispute_tectics(self):
         prompt = ini + disagreement_levels + non_disagreement_labels + final
-        annotations_ci = []
+        prompts = []
         #
-        for index, utt in enumerate(
-            tqdm(self.utterances, desc="Processing utterances")
-        ):
+        for index, utt in enumerate(self.utterances):
             conv_hist = ""
             text = utt.text
             speaker = utt.get_speaker().id
@@ -121,12 +120,17 @@ class DisputeTactics:
                     conv_history=conv_hist,
                     post=self.conv_topic,
                 )
-                response_text = prompt_gpt4(
-                    formatted_prompt, self.openaiKey, self.model_type, self.llm
-                )
                 # print(formatted_prompt)
-                annotations_ci.append(response_text)
+                prompts.append(formatted_prompt)
             except Exception as e:
                 print("Error: ", e)
-                annotations_ci.append(-1)
+                prompts.append(None)
+        annotations_ci = prompt_batch(
+            prompts,
+            self.openaiKey,
+            self.model_type,
+            self.llm,
+            output=output_spec,
+            prefix=static_prefix(prompt),
+        )
         return annotations_ci
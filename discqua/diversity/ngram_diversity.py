@@ -6,132 +6,234 @@ from discqua.utils import dprint, save_dict_2_json
 from .stopwords import stopwords
 
 ###################################################################
-stopwords = [w.strip() for w in stopwords]
+stopwords = frozenset(w.strip() for w in stopwords)
 
 
 ###################################################################
-def get_metrics_allwords(u1, u2):
-    words_u1 = [w for w in u1.split()]
-    words_u2 = [w for w in u2.split()]
-    common_words = [w for w in words_u1 if w in words_u2]
-    number_of_common_words = len(common_words)
+def ngram_matrix(utterances, n=1):
+    """Counts the n-grams of each utterance, tokenized once by whitespace.
 
-    number_of_words_u1 = len(words_u1)
-    number_of_words_u2 = len(words_u2)
-    unique_words_of_u1 = list(set(words_u1))
-    unique_words_of_u2 = list(set(words_u2))
-    unique_common_words = list(set(unique_words_of_u1 + unique_words_of_u2))
+    Each distinct n-gram gets an integer ID, its column in the count matrix.
 
-    reply_fraction = float(number_of_common_words) / float(number_of_words_u2)
-    op_fraction = float(number_of_common_words) / float(number_of_words_u1)
-    jaccard = float((number_of_common_words)) / float((len(unique_common_words)))
+    Returns:
+        tuple: The utterances x n-grams count matrix (scipy CSR), and two boolean arrays
+               marking the n-grams made only of stopwords and only of content words.
+    """
+    import numpy as np
+    from scipy.sparse import csr_matrix
 
-    return (number_of_common_words, reply_fraction, op_fraction, jaccard)
+    vocabulary = {}
+    indices = []
+    indptr = [0]
+    for utterance in utterances:
+        words = utterance.split()
+        ngrams = words if n == 1 else zip(*(words[k:] for k in range(n)))
+        indices.extend(vocabulary.setdefault(g, len(vocabulary)) for g in ngrams)
+        indptr.append(len(indices))
+    counts = csr_matrix(
+        (
+            np.ones(len(indices), dtype=np.int64),
+            np.array(indices, dtype=np.int32),
+            np.array(indptr, dtype=np.int64),
+        ),
+        shape=(len(indptr) - 1, len(vocabulary)),
+    )
+    counts.sum_duplicates()
+    if n == 1:
+        stop_words = [g in stopwords for g in vocabulary]
+        content_words = [not is_stop for is_stop in stop_words]
+    else:
+        stop_words = [all(w in stopwords for w in g) for g in vocabulary]
+        content_words = [not any(w in stopwords for w in g) for g in vocabulary]
+    return (
+        counts,
+        np.array(stop_words, dtype=bool),
+        np.array(content_words, dtype=bool),
+    )
 
 
-def get_metrics_stopwords(u1, u2):
-    words_u1 = [w for w in u1.split() if w in stopwords]
-    words_u2 = [w for w in u2.split() if w in stopwords]
-    common_words = [w for w in words_u1 if w in words_u2]
-    number_of_common_words = len(common_words)
-
-    number_of_words_u1 = len(words_u1)
-    number_of_words_u2 = len(words_u2)
-    unique_words_of_u1 = list(set(words_u1))
-    unique_words_of_u2 = list(set(words_u2))
-    unique_common_words = list(set(unique_words_of_u1 + unique_words_of_u2))
-
-    if number_of_words_u2 == 0:
-        reply_fraction = 0
-    else:
-        reply_fraction = float(number_of_common_words) / float(number_of_words_u2)
-    if number_of_words_u1 == 0:
-        op_fraction = 0
-    else:
-        op_fraction = float(number_of_common_words) / float(number_of_words_u1)
-    if len(unique_common_words) == 0:
-        jaccard = 0
-    else:
-        jaccard = float((number_of_common_words)) / float((len(unique_common_words)))
+def select_pairs(msgsid_list, pairs="adjacent", replyto_list=None, window=2):
+    """Selects the pairs of utterances that are compared.
 
-    return (number_of_common_words, reply_fraction, op_fraction, jaccard)
+    Args:
+        msgsid_list (list[str]): List of messages ids corresponding to each utterance.
+        pairs (str): "adjacent" for each utterance and the previous one, "reply" for each utterance and the utterance it replies to,
+                     "window" for each utterance and each of the `window` previous ones.
+        replyto_list (list[str]): List indicating the message ID each utterance is replying to. Required with pairs="reply".
+        window (int): Number of previous utterances compared with each utterance with pairs="window".
 
+    Returns:
+        tuple: The index arrays of the original and the reply utterance of each pair, ordered by reply.
+    """
+    import numpy as np
 
-def get_metrics_contentwords(u1, u2):
-    words_u1 = [w for w in u1.split() if w not in stopwords]
-    words_u2 = [w for w in u2.split() if w not in stopwords]
-    common_words = [w for w in words_u1 if w in words_u2]
-    number_of_common_words = len(common_words)
-
-    number_of_words_u1 = len(words_u1)
-    number_of_words_u2 = len(words_u2)
-    unique_words_of_u1 = list(set(words_u1))
-    unique_words_of_u2 = list(set(words_u2))
-    unique_common_words = list(set(unique_words_of_u1 + unique_words_of_u2))
-
-    if number_of_words_u2 == 0:
-        reply_fraction = 0
-    else:
-        reply_fraction = float(number_of_common_words) / float(number_of_words_u2)
-    if number_of_words_u1 == 0:
-        op_fraction = 0
-    else:
-        op_fraction = float(number_of_common_words) / float(number_of_words_u1)
-    if len(unique_common_words) == 0:
-        jaccard = 0
-    else:
-        jaccard = float((number_of_common_words)) / float((len(unique_common_words)))
+    size = len(msgsid_list)
+    if pairs == "reply":
+        index_of = {str(msg_id): i for i, msg_id in enumerate(msgsid_list)}
+        originals = []
+        replies = []
+        # the first utterance starts the discussion, and replies to utterances outside
+        # of it are skipped
+        for i, reply_to in enumerate(replyto_list[1:], start=1):
+            j = index_of.get(str(reply_to))
+            if j is not None and j != i:
+                originals.append(j)
+                replies.append(i)
+        return np.array(originals, dtype=np.int64), np.array(replies, dtype=np.int64)
+    window = 1 if pairs == "adjacent" else window
+    distances = np.arange(1, min(window, size - 1) + 1, dtype=np.int64)
+    replies = np.concatenate(
+        [np.arange(d, size, dtype=np.int64) for d in distances]
+        or [np.zeros(0, dtype=np.int64)]
+    )
+    originals = replies - np.repeat(distances, size - distances)
+    order = np.lexsort((originals, replies))
+    return originals[order], replies[order]
 
-    return (number_of_common_words, reply_fraction, op_fraction, jaccard)
 
+def pair_overlaps(counts, originals, replies):
+    """Computes the overlap metrics of the selected pairs from the n-gram count matrix, as
+    sparse row products: the number of n-grams of the original that occur in the reply,
+    their fractions of the n-grams of the reply and of the original, and the Jaccard
+    similarity over the distinct n-grams. The fractions of an utterance without n-grams
+    are 0.
 
-def ngramdiversity(message_list, msgsid_list, disc_id):
-    """Computes lexical similarity features between consecutive utterance pairs in a discussion.
-    For each adjacent pair, it extracts overlap metrics based on all words, stopwords, and content words.
+    Returns:
+        list[tuple]: The (common, reply fraction, op fraction, jaccard) values of each pair.
+    """
+    import numpy as np
+
+    present = counts.copy()
+    present.data[:] = 1
+    counts_u1 = counts[originals]
+    present_u2 = present[replies]
+    common = np.asarray(counts_u1.multiply(present_u2).sum(axis=1)).ravel()
+    distinct_common = np.asarray(
+        present[originals].multiply(present_u2).sum(axis=1)
+    ).ravel()
+    totals = np.asarray(counts.sum(axis=1)).ravel()
+    distinct = np.diff(present.indptr)
+    number_of_words_u1 = totals[originals]
+    number_of_words_u2 = totals[replies]
+    number_of_unique_words = distinct[originals] + distinct[replies] - distinct_common
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reply_fraction = common / number_of_words_u2
+        op_fraction = common / number_of_words_u1
+        jaccard = common / number_of_unique_words
+    return [
+        (
+            c,
+            r if n2 else 0,
+            o if n1 else 0,
+            j if u else 0,
+        )
+        for c, r, o, j, n1, n2, u in zip(
+            common.tolist(),
+            reply_fraction.tolist(),
+            op_fraction.tolist(),
+            jaccard.tolist(),
+            number_of_words_u1.tolist(),
+            number_of_words_u2.tolist(),
+            number_of_unique_words.tolist(),
+        )
+    ]
+
+
+def _pair_metrics(u1, u2, words="all"):
+    counts, stop_words, content_words = ngram_matrix([str(u1), str(u2)])
+    if words == "stop":
+        counts = counts[:, stop_words]
+    elif words == "content":
+        counts = counts[:, content_words]
+    return pair_overlaps(counts, [0], [1])[0]
+
+
+def get_metrics_allwords(u1, u2):
+    return _pair_metrics(u1, u2)
+
+
+def get_metrics_stopwords(u1, u2):
+    return _pair_metrics(u1, u2, "stop")
+
+
+def get_metrics_contentwords(u1, u2):
+    return _pair_metrics(u1, u2, "content")
+
+
+def ngramdiversity(
+    message_list,
+    msgsid_list,
+    disc_id,
+    n=1,
+    pairs="adjacent",
+    replyto_list=None,
+    window=2,
+):
+    """Computes lexical similarity features between utterance pairs in a discussion.
+    For each pair, it extracts overlap metrics based on all n-grams, stopword n-grams, and content word n-grams.
 
     Args:
         message_list (list[str]):  The list of utterances in the discussion.
         msgsid_list (list[str]) : List of messages ids corresponding to each utterance.
         disc_id (str): Unique identifier for the discussion.
+        n (int): Order of the compared n-grams. Defaults to 1 (words).
+        pairs (str): The compared pairs: "adjacent" for consecutive utterances, "reply" for each utterance and the utterance it replies to,
+                     or "window" for each utterance and each of the `window` previous utterances. Defaults to "adjacent".
+        replyto_list (list[str]): List indicating the message ID each utterance is replying to. Required with pairs="reply".
+        window (int): Number of previous utterances compared with each utterance with pairs="window". Defaults to 2.
 
     Returns:
         dict[str, dict[str, list[dict[str, float]]]]: A nested dictionary where the top-level key is the discussion ID.
         Each value maps a pair of message IDs to a list of dictionaries, each containing language overlap features
-        for all words, stopwords, and content words, respectively.
+        for all n-grams, stopword n-grams, and content word n-grams, respectively.
     """
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
+    if pairs not in ("adjacent", "reply", "window"):
+        print(
+            f"Unknown pairs '{pairs}'. Expected among: adjacent, reply, window. Exiting"
+        )
+        sys.exit(1)
+    if pairs == "reply" and (
+        replyto_list is None or len(replyto_list) != len(msgsid_list)
+    ):
+        print("The lengths of 'replyto_list' and 'msgsid_list' do not match")
+        sys.exit(1)
+    if int(n) < 1 or (pairs == "window" and int(window) < 1):
+        print("'n' and 'window' must be positive integers. Exiting")
+        sys.exit(1)
     timestr = time.strftime("%Y%m%d-%H%M%S")
-    utterances = message_list
     language_feat_dict = {}
     dprint("info", f"ngram diversity-Proccessing disc: {disc_id} ")
+    # each utterance is tokenized once into a row of n-gram counts, and the metrics of
+    # all pairs are computed together, for all n-grams, stopword and content n-grams
+    counts, stop_ngrams, content_ngrams = ngram_matrix(
+        [str(utt) for utt in message_list], int(n)
+    )
+    originals, replies = select_pairs(msgsid_list, pairs, replyto_list, int(window))
+    features = [
+        pair_overlaps(matrix, originals, replies)
+        for matrix in (counts, counts[:, stop_ngrams], counts[:, content_ngrams])
+    ]
     utt_pair_dict = {}
-    features_allwords_dict = {}
-    features_stopwords_dict = {}
-    features_content_dict = {}
-    for i, utt in enumerate(utterances):
-        if i == 0:
-            continue
-        utt2_text_iter = utterances[i]
-        utt1_text_iter = utterances[i - 1]
-        pair_key = f"pair_{msgsid_list[i-1]}_{msgsid_list[i]}"
-
-        number_of_common_words, reply_fraction, op_fraction, jaccard = (
-            get_metrics_allwords(utt1_text_iter, utt2_text_iter)
-        )
-        (
-            number_of_common_stopwords,
-            reply_fraction_stopwords,
-            op_fraction_stopwords,
-            jaccard_stopwords,
-        ) = get_metrics_stopwords(utt1_text_iter, utt2_text_iter)
+    for k, (i, j) in enumerate(zip(originals.tolist(), replies.tolist())):
+        pair_key = f"pair_{msgsid_list[i]}_{msgsid_list[j]}"
         (
-            number_of_content_words,
-            reply_fraction_content,
-            op_fraction_content,
-            jaccard_content,
-        ) = get_metrics_contentwords(utt1_text_iter, utt2_text_iter)
+            (number_of_common_words, reply_fraction, op_fraction, jaccard),
+            (
+                number_of_common_stopwords,
+                reply_fraction_stopwords,
+                op_fraction_stopwords,
+                jaccard_stopwords,
+            ),
+            (
+                number_of_content_words,
+                reply_fraction_content,
+                op_fraction_content,
+                jaccard_content,
+            ),
+        ) = (view[k] for view in features)
         features_allwords_dict = {
             "n_comwords": number_of_common_words,
             "reply_fra_comwords": reply_fraction,
@@ -1,13 +1,12 @@
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     getModel,
     getUtterances,
     isValidResponse,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
     sleep,
     validateInputParams,
@@ -35,9 +34,12 @@ Please, ensure that your last statement is the score in brackets [].
 """
 
 
+output_spec = OutputSpec.label()
+
+
 def calculate_response_engagement_score(utts, topic, openAIKEY, model_type, model, ctx):
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -56,12 +58,14 @@ def calculate_response_engagement_score(utts, topic, openAIKEY, model_type, mode
                 conv_history=conv_hist,
                 post=topic,
             )
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
             # print(formatted_prompt)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    annotations_ci = prompt_batch(
+        prompts, openAIKEY, model_type, model, output=output_spec
+    )
     return annotations_ci
 
 
@@ -1,11 +1,14 @@
 import sys
 import time
-from datetime import datetime
 
-from convokit import Corpus, HyperConvo, Speaker, Utterance
-from dateutil.relativedelta import relativedelta
+from discqua.utils import (
+    dprint,
+    getCorpus,
+    getTimestampedUtterances,
+    save_dict_2_json,
+)
 
-from discqua.utils import dprint, save_dict_2_json
+from .reciprocity_motifs import ReciprocityMotifs
 
 
 def reciprocity(
@@ -28,33 +31,14 @@ def reciprocity(
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
-    speakers_unq = set(speakers_list)
-    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
-    utterances = []
-    counter = 0
     timestr = time.strftime("%Y%m%d-%H%M%S")
-    tm = datetime.strptime(timestr, "%Y%m%d-%H%M%S")
-    for utt, speaker, msg_id, rplt in zip(
-        message_list, speakers_list, msgsid_list, replyto_list
-    ):
-        tm = tm + relativedelta(seconds=1)
-        if counter == 0:
-            replyto = None
-        else:
-            replyto = str(rplt)
-        u = Utterance(
-            id=f"{msg_id}",
-            speaker=speakers[speaker],
-            conversation_id=str(disc_id),
-            reply_to=replyto,
-            text=utt,
-            meta={"timestamp": tm},
-        )
-        u.timestamp = tm
-        utterances.append(u)
-        counter += 1
     if discussion_level:
-        corpus = Corpus(utterances=utterances)
+        from convokit import HyperConvo
+
+        utterances, speakers = getTimestampedUtterances(
+            message_list, speakers_list, msgsid_list, replyto_list, disc_id
+        )
+        corpus = getCorpus(utterances)
         dprint("info", "Corpus created successfully.")
         # corpus.print_summary_stats()
         #############################################################################################################
@@ -86,45 +70,22 @@ def reciprocity(
         return motifs_dict
     else:
         output_dict_rec = {}
-        output_dict_struct = {}
-        for utter_index, utter in enumerate(utterances):
+        dprint("info", f"Reciprocity-Proccessing discussion: {disc_id} per utterance")
+        # the reply hypergraph grows by one edge per utterance and the motif counts are
+        # updated in place, as HyperConvo(prefix_len=40) counts them on each prefix
+        motifs = ReciprocityMotifs(prefix_len=40)
+        for utter_index, (speaker, msg_id, reply_to) in enumerate(
+            zip(speakers_list, msgsid_list, replyto_list)
+        ):
+            motifs.add(msg_id, speaker, None if utter_index == 0 else reply_to)
             if utter_index == 0:
                 continue
             key_iter = str(msgsid_list[0]) + "-" + str(msgsid_list[utter_index])
-            corpus = Corpus(utterances=utterances[0 : utter_index + 1])
-            # print(f"Corpus for utterances 0 - {utter_index} created successfully.")
-            # corpus.print_summary_stats()
-            hc = HyperConvo(prefix_len=40, min_convo_len=2)
-            hc.transform(corpus)
-            #############################################################################################################
-            dt_features = corpus.get_vector_matrix("hyperconvo").to_dataframe()
-            dt_features = dt_features.fillna(-1)
-            feat_names = list(dt_features.columns)
-            motif_count_feats = [
-                x for x in feat_names if ("count" in x) and ("mid" not in x)
-            ]
-            motifs_dt = dt_features[motif_count_feats]
-            motifs_dt_tp = motifs_dt.transpose()
-            motifs_dict = motifs_dt_tp.to_dict()
-            #
-            dt_features_tp = dt_features.transpose()
-            features_dict = dt_features_tp.to_dict()
-            #
             if disc_id in output_dict_rec:
-                output_dict_rec[disc_id].append(
-                    [{key_iter: list(motifs_dict.values())}]
-                )
-            else:
-                output_dict_rec[disc_id] = [{key_iter: list(motifs_dict.values())}]
-            if disc_id in output_dict_struct:
-                output_dict_struct[disc_id].append(
-                    [{key_iter: list(features_dict.values())}]
-                )
+                output_dict_rec[disc_id].append([{key_iter: [motifs.features()]}])
             else:
-                output_dict_struct[disc_id] = [{key_iter: list(features_dict.values())}]
+                output_dict_rec[disc_id] = [{key_iter: [motifs.features()]}]
         #############################################################################################################
         save_dict_2_json(output_dict_rec, "reciprocity_per_ut_", disc_id, timestr)
-        # save_dict_2_json(output_dict_struct, "structure_fet_per_ut_", disc_id, timestr)
         #############################################################################################################
-        # return output_dict_rec, output_dict_struct
         return output_dict_rec
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+# the motif count features kept by reciprocity(), as named by convokit's HyperConvo
+RECIPROCITY = "count[reciprocity motif]"
+EXTERNAL_RECIPROCITY = "count[external reciprocity motif]"
+DYADIC = "count[dyadic interaction motif]"
+INCOMING_TRIADS = "count[incoming triads]"
+OUTGOING_TRIADS = "count[outgoing triads]"
+
+
+class ReciprocityMotifs:
+    """Motif counts of the reply hypergraph of a discussion, updated one reply edge at a
+    time.
+
+    Utterances are the nodes and speakers the hypernodes of the graph, as in convokit's
+    HyperConvo. Each reply adds an utterance edge and a speaker edge, and the reciprocity,
+    external reciprocity, dyadic interaction and incoming/outgoing triad counts are updated
+    in place. Like HyperConvo(prefix_len=40), only the first `prefix_len` utterances are
+    part of the graph.
+
+    Args:
+        prefix_len (int): Number of utterances the graph is built from. Defaults to 40.
+    """
+
+    def __init__(self, prefix_len=40):
+        self.prefix_len = prefix_len
+        self.size = 0
+        self.speaker_of = {}
+        self.parent = {}
+        self.children = defaultdict(list)
+        self.waiting = defaultdict(list)
+        self.hyper_out = defaultdict(set)
+        self.hyper_in = defaultdict(set)
+        self.counts = {
+            RECIPROCITY: 0,
+            EXTERNAL_RECIPROCITY: 0,
+            DYADIC: 0,
+            INCOMING_TRIADS: 0,
+            OUTGOING_TRIADS: 0,
+        }
+
+    def add(self, msg_id, speaker, reply_to=None):
+        if self.size >= self.prefix_len:
+            return
+        self.size += 1
+        msg_id = str(msg_id)
+        self.speaker_of[msg_id] = speaker
+        if reply_to is not None:
+            reply_to = str(reply_to)
+            if reply_to in self.speaker_of:
+                self._add_edge(msg_id, reply_to)
+            else:
+                # the replied utterance may still join the graph
+                self.waiting[reply_to].append(msg_id)
+        for child in self.waiting.pop(msg_id, []):
+            self._add_edge(child, msg_id)
+
+    def _add_edge(self, reply, target):
+        reply_speaker = self.speaker_of[reply]
+        target_speaker = self.speaker_of[target]
+        # reply -> target closes a motif with the edge target -> parent, and with each
+        # utterance already replying to `reply`
+        if reply == target:
+            # a self-reply closes a reciprocity motif with itself
+            self.counts[RECIPROCITY] += 1
+        parent = self.parent.get(target)
+        if parent is not None:
+            if self.speaker_of[parent] == reply_speaker:
+                self.counts[RECIPROCITY] += 1
+            else:
+                self.counts[EXTERNAL_RECIPROCITY] += 1
+        for child in self.children[reply]:
+            if self.speaker_of[child] == target_speaker:
+                self.counts[RECIPROCITY] += 1
+            else:
+                self.counts[EXTERNAL_RECIPROCITY] += 1
+        self.parent[reply] = target
+        self.children[target].append(reply)
+
+        if target_speaker in self.hyper_out[reply_speaker]:
+            return
+        if (
+            reply_speaker != target_speaker
+            and reply_speaker in self.hyper_out[target_speaker]
+        ):
+            self.counts[DYADIC] += 1
+        self.counts[INCOMING_TRIADS] += len(self.hyper_in[target_speaker])
+        self.counts[OUTGOING_TRIADS] += len(self.hyper_out[reply_speaker])
+        self.hyper_out[reply_speaker].add(target_speaker)
+        self.hyper_in[target_speaker].add(reply_speaker)
+
+    def features(self):
+        return {name: float(count) for name, count in self.counts.items()}
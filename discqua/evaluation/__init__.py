@@ -0,0 +1,2 @@
+from .batch import BatchStats, evaluate_corpus
+from .evaluate import EvaluationResult, evaluate
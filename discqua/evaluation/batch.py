@@ -0,0 +1,275 @@
+import glob
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from discqua.utils import (
+    Discussion,
+    dprint,
+    get_output_path,
+    get_saving_enabled,
+    set_output_path,
+    set_saving_enabled,
+)
+
+from .evaluate import MEASURES, evaluate
+
+# measures that load a model (language model, sentiment classifier or ECoh) and are run
+# by the bounded worker set of the main process, where the loaded models are shared
+_LOCAL_MODEL_MEASURES = ("controversy", "coherence_ecoh")
+
+
+def uses_model(measure):
+    return (
+        measure in _LOCAL_MODEL_MEASURES
+        or "openAIKEY" in inspect.signature(MEASURES[measure]).parameters
+    )
+
+
+def iter_discussion_files(source):
+    """Yields the paths of the discussion JSON files of `source`, which is a directory, a
+    glob pattern or a list of paths. Directories are listed lazily, in name order per
+    directory."""
+    if isinstance(source, (list, tuple)):
+        yield from source
+    elif os.path.isdir(source):
+        stack = [source]
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.name.endswith(".json"):
+                    yield entry.path
+    else:
+        yield from glob.iglob(source, recursive=True)
+
+
+def read_manifest(manifest):
+    """Returns the measures completed per file path, as recorded in a manifest."""
+    done = {}
+    if manifest is None or not os.path.exists(manifest):
+        return done
+    with open(manifest, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut by an interrupted run
+                continue
+            done.setdefault(entry["path"], set()).update(entry.get("completed", []))
+    return done
+
+
+class BatchStats:
+    """Throughput counters of a batch run, updated as the discussions complete."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.discussions = 0
+        self.utterances = 0
+        self.measures = 0
+        self.failed = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    @property
+    def discussions_per_second(self):
+        return self.discussions / max(self.elapsed, 1e-9)
+
+    @property
+    def utterances_per_second(self):
+        return self.utterances / max(self.elapsed, 1e-9)
+
+    def to_dict(self):
+        return {
+            "discussions": self.discussions,
+            "utterances": self.utterances,
+            "measures": self.measures,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed": self.elapsed,
+            "discussions_per_second": self.discussions_per_second,
+            "utterances_per_second": self.utterances_per_second,
+        }
+
+    def __repr__(self):
+        return (
+            f"BatchStats(discussions={self.discussions}, utterances={self.utterances}, "
+            f"failed={self.failed}, skipped={self.skipped}, "
+            f"{self.discussions_per_second:.2f} discussions/s, "
+            f"{self.utterances_per_second:.1f} utterances/s)"
+        )
+
+
+def _init_worker(output_path, saving_enabled, level):
+    set_output_path(output_path)
+    set_saving_enabled(saving_enabled)
+    logging.basicConfig(level=level)
+
+
+def _evaluate_file(path, metrics, evaluate_kwargs):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            discussion = Discussion.coerce(json.load(f))
+        result = evaluate(discussion, metrics=metrics, **evaluate_kwargs)
+    except (Exception, SystemExit) as e:
+        return {"path": path, "error": repr(e), "completed": [], "utterances": 0}
+    return {
+        "path": path,
+        "disc_id": str(result.disc_id),
+        "utterances": len(discussion),
+        "completed": list(result.results),
+        "errors": result.errors,
+        "seconds": result.seconds,
+    }
+
+
+def evaluate_corpus(
+    source,
+    metrics,
+    manifest=None,
+    processes=None,
+    model_workers=1,
+    max_pending=None,
+    log_every=100,
+    **evaluate_kwargs,
+):
+    """Runs several measures over a corpus of discussion JSON files, in the format of the example discussions.
+
+    The files are streamed from `source`. The measures that do not use a model are run in a process pool, and the measures that use a language model or another model are run by a bounded set of worker threads of the main process, which share the loaded models. Each measure saves its output files as when it is called directly.
+
+    Args:
+        source (str or list[str]): A directory (searched recursively for .json files), a glob pattern, or a list of file paths.
+        metrics (list[str]): Names of the measures to run, as in evaluate().
+        manifest (str): Path of a JSONL completion manifest. The completed measures of each file are appended to it, and the measures already recorded are skipped, so that an interrupted run can be resumed. Defaults to None.
+        processes (int): Number of processes running the measures without model. 0 runs them in the main process. Defaults to the number of CPUs.
+        model_workers (int): Number of discussions evaluated concurrently by the measures that use a model. Defaults to 1.
+        max_pending (int): Maximum number of discussions in flight. Defaults to twice the number of workers.
+        log_every (int): Number of completed discussions between two throughput logs. Defaults to 100.
+        **evaluate_kwargs: Arguments passed to evaluate(), e.g. openAIKEY, model_type, model_path, gpu, ctx, device, discussion_level and options.
+
+    Returns:
+        BatchStats: The throughput counters of the run: discussions and utterances processed, per second, failed and skipped discussions.
+    """
+    unknown = [name for name in metrics if name not in MEASURES]
+    if unknown:
+        print(
+            f"Unknown measures: {', '.join(unknown)}. Expected among: {', '.join(MEASURES)}. Exiting"
+        )
+        sys.exit(1)
+    metrics = list(dict.fromkeys(metrics))
+    if processes is None:
+        processes = os.cpu_count() or 1
+    model_workers = max(1, int(model_workers))
+    cpu_metrics = [name for name in metrics if not uses_model(name)]
+    model_metrics = [name for name in metrics if uses_model(name)]
+    if max_pending is None:
+        max_pending = 2 * (processes + model_workers)
+    max_pending = max(1, max_pending)
+
+    done = read_manifest(manifest)
+    stats = BatchStats()
+    out = open(manifest, "a", encoding="utf-8") if manifest else None
+    cpu_pool = None
+    if cpu_metrics and processes > 0:
+        cpu_pool = ProcessPoolExecutor(
+            processes,
+            initializer=_init_worker,
+            initargs=(
+                get_output_path(),
+                get_saving_enabled(),
+                logging.getLogger().level,
+            ),
+        )
+    model_pool = ThreadPoolExecutor(model_workers) if model_metrics else None
+    pending = {}
+    # per file: number of measure groups still running, utterances and failure flag
+    files = {}
+
+    def record(summary):
+        path = summary["path"]
+        if out is not None and summary["completed"]:
+            out.write(json.dumps(summary, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+        state = files[path]
+        state["groups"] -= 1
+        state["utterances"] = max(state["utterances"], summary["utterances"])
+        state["failed"] |= bool(summary.get("error") or summary.get("errors"))
+        if summary.get("error"):
+            dprint("error", f"Failed to evaluate {path}: {summary['error']}")
+        with stats.lock:
+            stats.measures += len(summary["completed"])
+            if state["groups"] == 0:
+                del files[path]
+                stats.discussions += 1
+                stats.utterances += state["utterances"]
+                stats.failed += state["failed"]
+                if log_every and stats.discussions % log_every == 0:
+                    dprint("info", f"Batch progress: {stats}")
+
+    def drain(limit):
+        while len(pending) > limit:
+            finished, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in finished:
+                del pending[future]
+                record(future.result())
+
+    try:
+        for path in iter_discussion_files(source):
+            completed = done.get(path, set())
+            groups = [
+                [name for name in group if name not in completed]
+                for group in (cpu_metrics, model_metrics)
+            ]
+            if not any(groups):
+                stats.skipped += 1
+                continue
+            files[path] = {
+                "groups": sum(1 for group in groups if group),
+                "utterances": 0,
+                "failed": False,
+            }
+            cpu_todo, model_todo = groups
+            if cpu_todo:
+                if cpu_pool is None:
+                    record(_evaluate_file(path, cpu_todo, evaluate_kwargs))
+                else:
+                    future = cpu_pool.submit(
+                        _evaluate_file, path, cpu_todo, evaluate_kwargs
+                    )
+                    pending[future] = path
+            if model_todo:
+                future = model_pool.submit(
+                    _evaluate_file, path, model_todo, evaluate_kwargs
+                )
+                pending[future] = path
+            drain(max_pending - 1)
+        drain(0)
+    finally:
+        for pool in (cpu_pool, model_pool):
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        if out is not None:
+            out.close()
+    dprint("info", f"Batch completed: {stats}")
+    return stats
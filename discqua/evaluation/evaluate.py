@@ -0,0 +1,213 @@
+import inspect
+import sys
+import time
+
+from discqua.argQualityAspects import arg_dimensions
+from discqua.argQualityOverall import overall_arg_quality
+from discqua.coherence import coherence_disc, coherence_ecoh, coherence_response
+from discqua.collaboration import collaboration
+from discqua.controversy import controversy
+from discqua.dialogue_acts import dialogue_acts
+from discqua.dispute_tactics import dispute_tactics
+from discqua.diversity import diversity_disc, diversity_response, ngramdiversity
+from discqua.empathy import empathy
+from discqua.engagement import engagement_disc, engagement_response, reciprocity
+from discqua.fused import fused_metrics
+from discqua.informativeness import informativeness_disc, informativeness_response
+from discqua.persuasiveness import persuasion_strategy, persuasiveness_disc
+from discqua.politeness import politeness, politeness_ngrams
+from discqua.powerstatus_socialbias import coordination, social_bias
+from discqua.readability import readability
+from discqua.sentiment_analysis import sentiment
+from discqua.toxicity import toxicity
+from discqua.turnTaking import make_visualization, participation
+from discqua.utils import (
+    Discussion,
+    dprint,
+    get_shared_discussion,
+    set_shared_discussion,
+)
+
+MEASURES = {
+    function.__name__: function
+    for function in (
+        arg_dimensions,
+        overall_arg_quality,
+        coherence_disc,
+        coherence_ecoh,
+        coherence_response,
+        collaboration,
+        controversy,
+        dialogue_acts,
+        dispute_tactics,
+        diversity_disc,
+        diversity_response,
+        ngramdiversity,
+        empathy,
+        engagement_disc,
+        engagement_response,
+        reciprocity,
+        fused_metrics,
+        informativeness_disc,
+        informativeness_response,
+        persuasion_strategy,
+        persuasiveness_disc,
+        politeness,
+        politeness_ngrams,
+        coordination,
+        social_bias,
+        readability,
+        sentiment,
+        toxicity,
+        make_visualization,
+        participation,
+    )
+}
+
+# the measures run when evaluate() is given no list: those that need no language model,
+# no API key and no display
+DEFAULT_MEASURES = (
+    "collaboration",
+    "ngramdiversity",
+    "reciprocity",
+    "politeness_ngrams",
+    "coordination",
+    "readability",
+    "participation",
+)
+
+
+class EvaluationResult:
+    """The results of the measures run on one discussion by evaluate().
+
+    Attributes:
+        disc_id (str): Unique identifier for the discussion.
+        results (dict): The result of each measure that completed, as returned by the measure.
+        errors (dict): The error message of each measure that failed.
+        seconds (dict): The running time of each measure, in seconds.
+    """
+
+    def __init__(self, disc_id):
+        self.disc_id = disc_id
+        self.results = {}
+        self.errors = {}
+        self.seconds = {}
+
+    def __getitem__(self, measure):
+        return self.results[measure]
+
+    def __contains__(self, measure):
+        return measure in self.results
+
+    def __iter__(self):
+        return iter(self.results)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        return {
+            "disc_id": self.disc_id,
+            "results": self.results,
+            "errors": self.errors,
+            "seconds": self.seconds,
+        }
+
+    def __repr__(self):
+        return (
+            f"EvaluationResult({self.disc_id!r}, results={list(self.results)}, "
+            f"errors={list(self.errors)})"
+        )
+
+
+def _arguments(function, available, options):
+    parameters = inspect.signature(function).parameters
+    kwargs = {
+        name: value
+        for name, value in available.items()
+        if name in parameters and value is not None
+    }
+    kwargs.update(options)
+    return kwargs
+
+
+def evaluate(
+    discussion,
+    metrics=None,
+    openAIKEY="",
+    model_type="openai",
+    model_path="",
+    gpu=False,
+    ctx=1,
+    device=None,
+    discussion_level=False,
+    options=None,
+):
+    """Runs several measures on a discussion. The input is normalized once, and the convokit speakers, utterances and corpus are built once and shared by all the measures.
+
+    Args:
+        discussion (Discussion or dict): The discussion, as a utils.Discussion, a dict in the format of the example discussions (with "id" and "logs"), or a dict with the keys message_list, speakers_list, msgsid_list, disc_id and optionally replyto_list and conver_topic.
+        metrics (list[str]): Names of the measures to run, e.g. ["toxicity", "reciprocity", "participation"]. Defaults to the measures that need no language model, listed in DEFAULT_MEASURES.
+        openAIKEY (str): OpenAI API key, required if using OpenAI-based models. Defaults to "".
+        model_type (str): Language model type to use for the language model based measures. Defaults to "openai".
+        model_path (str): Path to the model, used only for model_type "transformers". Defaults to "".
+        gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
+        ctx (int): Number of previous utterances to include as context for each input. Defaults to 1.
+        device (str): The device to load the models on. If None, each measure uses its own default. Defaults to None.
+        discussion_level (bool): A boolean flag passed to the measures computed either at the discussion or at the utterance level. Defaults to False.
+        options (dict): Extra keyword arguments per measure, e.g. {"arg_dimensions": {"dimension": "logic"}}. Defaults to None.
+
+    Returns:
+        EvaluationResult: The result of each measure, indexable by measure name, along with the errors and running times of the measures.
+    """
+    discussion = Discussion.coerce(discussion)
+    metrics = list(DEFAULT_MEASURES if metrics is None else dict.fromkeys(metrics))
+    options = options or {}
+    unknown = [name for name in list(metrics) + list(options) if name not in MEASURES]
+    if unknown:
+        print(
+            f"Unknown measures: {', '.join(unknown)}. Expected among: {', '.join(MEASURES)}. Exiting"
+        )
+        sys.exit(1)
+
+    available = {
+        "message_list": discussion.message_list,
+        "speakers_list": discussion.speakers_list,
+        "speaker_list": discussion.speakers_list,
+        "msgsid_list": discussion.msgsid_list,
+        "replyto_list": discussion.replyto_list,
+        "disc_id": discussion.disc_id,
+        "conver_topic": discussion.conver_topic,
+        "openAIKEY": openAIKEY,
+        "model_type": model_type,
+        "model_path": model_path,
+        "gpu": gpu,
+        "ctx": ctx,
+        "device": device,
+        "discussion_level": discussion_level,
+    }
+    evaluation = EvaluationResult(discussion.disc_id)
+    previous = get_shared_discussion()
+    set_shared_discussion(discussion)
+    try:
+        for name in metrics:
+            function = MEASURES[name]
+            dprint(
+                "info", f"Evaluate-Running {name} on discussion: {discussion.disc_id}"
+            )
+            start = time.monotonic()
+            try:
+                evaluation.results[name] = function(
+                    **_arguments(function, available, options.get(name, {}))
+                )
+            except (Exception, SystemExit) as e:
+                # a failing measure, including its input validation, does not stop the others
+                dprint(
+                    "error", f"{name} failed on discussion {discussion.disc_id}: {e!r}"
+                )
+                evaluation.errors[name] = repr(e)
+            evaluation.seconds[name] = time.monotonic() - start
+    finally:
+        set_shared_discussion(previous)
+    return evaluation
@@ -0,0 +1 @@
+from .fused_metrics import fused_metrics
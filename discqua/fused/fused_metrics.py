@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+import re
+import sys
+import time
+
+from discqua.coherence.coherence_response import prompt as coherence_prompt
+from discqua.dialogue_acts.dialogue_acts import final as dialogue_acts_final
+from discqua.dialogue_acts.dialogue_acts import ini as dialogue_acts_ini
+from discqua.dialogue_acts.dialogue_acts import speech_act_labels
+from discqua.diversity.diversity_response import prompt as diversity_prompt
+from discqua.empathy.empathy_intents import expressed_empathy_labels
+from discqua.empathy.empathy_intents import final as empathy_final
+from discqua.empathy.empathy_intents import ini as empathy_ini
+from discqua.engagement.engagement_response import prompt as engagement_prompt
+from discqua.informativeness.informativeness_response import (
+    prompt as informativeness_prompt,
+)
+from discqua.politeness.politeness_analysis import prompt as politeness_prompt
+from discqua.powerstatus_socialbias.social_bias import final as social_bias_final
+from discqua.powerstatus_socialbias.social_bias import ini as social_bias_ini
+from discqua.powerstatus_socialbias.social_bias import social_bias_labels
+from discqua.sentiment_analysis.sentiment_analysis import final as sentiment_final
+from discqua.sentiment_analysis.sentiment_analysis import ini as sentiment_ini
+from discqua.sentiment_analysis.sentiment_analysis import sentiment_labels
+from discqua.toxicity.toxicity import prompt as toxicity_prompt
+from discqua.utils import (
+    OutputSpec,
+    dprint,
+    extractFeature,
+    getModel,
+    getUtterances,
+    isValidResponse,
+    prompt_batch,
+    save_dict_2_json,
+    sleep,
+    static_prefix,
+    validateInputParams,
+)
+
+
+def _task(template):
+    # the instructions that follow the utterance in the metric's own prompt
+    return re.split(r'\*(?:NEW UTTERANCE|RESPONSE)\*: "\{\w+\}"', template)[-1]
+
+
+# kind "rating": one bracketed score, split on `phrase` and parsed by isValidResponse.
+# kind "labels": a structured label list, parsed by extractFeature.
+# str_keys, wrap_feature and wrap_disc reproduce the return shape of each metric.
+METRICS = {
+    "toxicity": {
+        "kind": "rating",
+        "task": _task(toxicity_prompt),
+        "phrase": "toxicity of the new utterance is:",
+        "output": "toxicity_per_response",
+        "str_keys": True,
+    },
+    "politeness": {
+        "kind": "rating",
+        "task": _task(politeness_prompt),
+        "phrase": "politeness of the new response is:",
+        "output": "politeness_per_response",
+        "str_keys": False,
+    },
+    "diversity_response": {
+        "kind": "rating",
+        "task": _task(diversity_prompt),
+        "phrase": "diversity of the arguments of the new response is:",
+        "output": "diversity_per_response",
+        "str_keys": False,
+    },
+    "informativeness_response": {
+        "kind": "rating",
+        "task": _task(informativeness_prompt),
+        "phrase": "informativeness of the new response is:",
+        "output": "informativeness_per_response",
+        "str_keys": False,
+    },
+    "coherence_response": {
+        "kind": "rating",
+        "task": _task(coherence_prompt),
+        "phrase": "coherence of the new response is:",
+        "output": "coherence_per_response",
+        "str_keys": False,
+    },
+    "engagement_response": {
+        "kind": "rating",
+        "task": _task(engagement_prompt),
+        "phrase": "engagement score of the new response is:",
+        "output": "engagement_per_response",
+        "str_keys": False,
+    },
+    "sentiment": {
+        "kind": "labels",
+        "task": sentiment_ini + sentiment_labels + _task(sentiment_final),
+        "n_labels": 3,
+        "output": "sentimentlabel_per_utterance",
+        "str_keys": True,
+        "wrap_feature": True,
+        "wrap_disc": True,
+    },
+    "social_bias": {
+        "kind": "labels",
+        "task": social_bias_ini + social_bias_labels + _task(social_bias_final),
+        "n_labels": 6,
+        "output": "socialbias_per_utterance",
+        "str_keys": False,
+        "wrap_feature": True,
+        "wrap_disc": True,
+    },
+    "dialogue_acts": {
+        "kind": "labels",
+        "task": dialogue_acts_ini + speech_act_labels + _task(dialogue_acts_final),
+        "n_labels": 14,
+        "output": "dialogueact_per_utterance",
+        "str_keys": False,
+        "wrap_feature": True,
+        "wrap_disc": True,
+    },
+    "empathy": {
+        "kind": "labels",
+        "task": empathy_ini + expressed_empathy_labels + _task(empathy_final),
+        "n_labels": 15,
+        "output": "expressed_empathy_label_per_response",
+        "str_keys": False,
+        "wrap_feature": False,
+        "wrap_disc": False,
+    },
+}
+
+intro = """You are an annotator of utterances in online discussions. Below are {n_tasks} annotation tasks, each introduced by a header line of the form '### TASK_NAME'.
+After the tasks, you will be presented with a conversation history (which can be empty if the new utterance is the first utterance made in the conversation) from a discussion in an online chatroom with respect to this potentially controversial post between two or more individuals, and with the new utterance to annotate. In the tasks, the new utterance is also referred to as the new response.
+"""
+
+context = """\n\n
+Post: {post}
+All individuals answer to each other by presenting arguments on why they think the post(s) is or isn't reasonable, possibly incorporating inflammatory and aggressive speech.
+
+*CONVERSATION HISTORY*: "{conv_history}"
+
+*NEW UTTERANCE*: "{utterance}"
+
+Noteworthy, the conversation history is provided for you to simply understand the utterances made before the new utterance so as to help you better annotate the new utterance.
+Please provide the final answers directly with no reasoning steps.
+Answer every task in the order given, each in its own section that starts with the header line of the task (e.g. '### TOXICITY') followed by the answer in the format requested by the task.
+"""
+
+
+def _header(name):
+    return "### " + name.upper()
+
+
+def build_fused_prompt(metrics):
+    tasks = "\n\n".join(
+        _header(name) + "\n" + METRICS[name]["task"].strip() for name in metrics
+    )
+    return intro.format(n_tasks=len(metrics)) + "\n\n" + tasks + context
+
+
+def fused_output_spec(metrics):
+    budget = 0
+    for name in metrics:
+        metric = METRICS[name]
+        if metric["kind"] == "rating":
+            budget += OutputSpec.label().max_tokens
+        else:
+            budget += OutputSpec.labels(metric["n_labels"]).max_tokens
+    return OutputSpec.text(budget)
+
+
+def split_fused_answer(answer, metrics):
+    """Splits a fused answer into the answers of its metrics, -1 for missing sections."""
+    sections = {name: -1 for name in metrics}
+    if answer == -1:
+        return sections
+    headers = {_header(name): name for name in metrics}
+    parts = re.split(r"^[ \t]*(#+[ \t]*[A-Za-z_]+)[ \t]*$", answer, flags=re.M)
+    for header, body in zip(parts[1::2], parts[2::2]):
+        name = headers.get("### " + header.lstrip("#").strip().upper())
+        if name is not None and body.strip():
+            sections[name] = body.strip()
+    return sections
+
+
+def calculate_fused_labels(utts, topic, openAIKEY, model_type, model, ctx, metrics):
+    prompt = build_fused_prompt(metrics)
+    prompts = []
+    for index, utt in enumerate(utts):
+        conv_hist = ""
+        text = utt.text
+        speaker = utt.get_speaker().id
+        if index > 0:
+            start_ctx = max(0, index - ctx)
+            for i in range(start_ctx, index):
+                prev_utt = utts[i]
+                prev_speaker = prev_utt.get_speaker().id
+                prev_text = prev_utt.text
+                conv_hist += f"\n<user_name={prev_speaker}>\n{prev_text}\n"
+
+        try:
+            formatted_prompt = prompt.format(
+                utterance="<user_name=" + speaker + ">" + "\n" + text,
+                conv_history=conv_hist,
+                post=topic,
+            )
+            # print(formatted_prompt)
+            prompts.append(formatted_prompt)
+        except Exception as e:
+            print("Error: ", e)
+            prompts.append(None)
+    annotations_ci = prompt_batch(
+        prompts,
+        openAIKEY,
+        model_type,
+        model,
+        output=fused_output_spec(metrics),
+        prefix=static_prefix(prompt),
+    )
+    return annotations_ci
+
+
+def _parse_metric(name, disc_id, answers, msgsid_list):
+    metric = METRICS[name]
+    ut_dict = {}
+    for counter, label in enumerate(answers):
+        if label == -1:
+            dprint(
+                "info", f"LLM output with missing {name} section, skipping response\n"
+            )
+            continue
+        key_iter = msgsid_list[counter]
+        if metric["str_keys"]:
+            key_iter = str(key_iter)
+        if metric["kind"] == "rating":
+            value = isValidResponse(label.split(metric["phrase"]))
+            if value == -1:
+                dprint(
+                    "info", f"LLM output with missing {name} label, skipping response\n"
+                )
+                dprint("info", label)
+                continue
+            ut_dict[key_iter] = value
+        else:
+            feature = {}
+            feature = extractFeature(feature, label)
+            if feature == -1:
+                continue
+            ut_dict[key_iter] = [feature] if metric["wrap_feature"] else feature
+    if metric["kind"] == "labels" and metric["wrap_disc"]:
+        return {disc_id: [ut_dict]}
+    return {disc_id: ut_dict}
+
+
+def fused_metrics(
+    message_list,
+    speakers_list,
+    msgsid_list,
+    disc_id,
+    conver_topic,
+    openAIKEY,
+    metrics=("toxicity", "politeness", "sentiment", "social_bias"),
+    model_type="openai",
+    model_path="",
+    gpu=False,
+    ctx=1,
+    device="auto",
+):
+    """Annotates each utterance in a discussion with several per-response measures at once, using one fused prompt and one language model call per utterance.
+
+    Args:
+        message_list (list[str]): The list of utterances in the discussion.
+        speakers_list (list[str]): The corresponding list of speakers for each utterance.
+        msgsid_list (list[str]) : List of messages ids corresponding to each utterance.
+        disc_id (str): Unique identifier for the discussion.
+        conver_topic(str): The topic of conversation.
+        openAIKEY (str): OpenAI API key, required if using OpenAI-based models.
+        metrics (list[str]): The measures to fuse, among "toxicity", "politeness", "diversity_response", "informativeness_response", "coherence_response", "engagement_response", "sentiment", "social_bias", "dialogue_acts" and "empathy". Defaults to ("toxicity", "politeness", "sentiment", "social_bias").
+        model_type (str): Language model type to use, either "openai" or "transformers". Defaults to "openai".
+        model_path (str): Path to the model, used only for model_type "transformers". Defaults to "".
+        gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
+        ctx (int): Number of previous utterances to include as context for each input. Defaults to 1.
+        device(str): The device to load the model on. If None, the device will be inferred. Defaults to auto.
+
+    Returns:
+        dict: A dictionary mapping each measure name to its result, structured as returned by the corresponding measure (e.g. toxicity()).
+    """
+    validateInputParams(model_type, openAIKEY, model_path, message_list, msgsid_list)
+    metrics = list(dict.fromkeys(metrics))
+    unknown = [name for name in metrics if name not in METRICS]
+    if unknown or not metrics:
+        print(f"Expected measures among: {', '.join(METRICS)}. Exiting")
+        sys.exit(1)
+    dprint("info", f"Building corpus of: {len(message_list)} utterances ")
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    llm = None
+
+    if model_type == "llama" or model_type == "transformers":
+        llm = getModel(model_path, gpu, model_type, device)
+
+    fused_llm_output_dict = {}
+    try:
+        utterances, speakers = getUtterances(
+            message_list, speakers_list, disc_id, replyto_list=[]
+        )
+        dprint(
+            "info",
+            f"Fused measures {', '.join(metrics)}-Proccessing discussion: {disc_id} with LLM ",
+        )
+        fused_llm_output_dict[disc_id] = calculate_fused_labels(
+            utterances, conver_topic, openAIKEY, model_type, llm, ctx, metrics
+        )
+        sleep(model_type)
+    except Exception as e:
+        print("Error: ", e)
+        print(disc_id)
+
+    save_dict_2_json(
+        fused_llm_output_dict, "llm_output_fused_per_response", disc_id, timestr
+    )
+
+    answers = {name: [] for name in metrics}
+    for answer in fused_llm_output_dict.get(disc_id, []):
+        for name, section in split_fused_answer(answer, metrics).items():
+            answers[name].append(section)
+
+    results = {}
+    for name in metrics:
+        if disc_id in fused_llm_output_dict:
+            results[name] = _parse_metric(name, disc_id, answers[name], msgsid_list)
+        else:
+            results[name] = {}
+        save_dict_2_json(results[name], METRICS[name]["output"], disc_id, timestr)
+    return results
@@ -1,17 +1,18 @@
 # -*- coding: utf-8 -*-
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     getModel,
     getUtterances,
     isValidResponse,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
+    score_labels,
     sleep,
     validateInputParams,
+    validateScoring,
 )
 
 prompt = """\n\n
@@ -34,11 +35,18 @@ Please, ensure that your last statement is the score in brackets [].
 """
 
 
+output_spec = OutputSpec.label()
+
+answer_prefix = "The informativeness of the new response is: ["
+
+rating_labels = ["1", "2", "3", "4", "5"]
+
+
 def calculate_response_informative_score(
-    utts, topic, openAIKEY, model_type, model, ctx
+    utts, topic, openAIKEY, model_type, model, ctx, scoring="generate"
 ):
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -57,12 +65,16 @@ def calculate_response_informative_score(
                 conv_history=conv_hist,
                 post=topic,
             )
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
             # print(formatted_prompt)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    if scoring == "logits":
+        return score_labels(prompts, model, answer_prefix, rating_labels)
+    annotations_ci = prompt_batch(
+        prompts, openAIKEY, model_type, model, output=output_spec
+    )
     return annotations_ci
 
 
@@ -78,6 +90,8 @@ def informativeness_response(
     gpu=False,
     ctx=1,
     device="auto",
+    scoring="generate",
+    return_expected=False,
 ):
     """Computes per-response informativeness scores for a given conversation using a specified large language model (LLM).
     Each utterance is scored based on how much new and relevant information it contributes, given the conversational context.
@@ -94,13 +108,17 @@ def informativeness_response(
         gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
         ctx (int): Number of previous utterances to include as context for each input. Defaults to 1.
         device(str): The device to load the model on. If None, the device will be inferred. Defaults to auto.
+        scoring (str): "generate" to decode the answer, or "logits" to score the candidate labels with a single forward pass, for transformers models only. Defaults to "generate".
+        return_expected (bool): If True, the expected value of the label of each utterance under the label probabilities is returned as well, for scoring "logits" only. Defaults to False.
 
     Returns:
              dict[str, dict[str, int]]: A nested dictionary where each outer key is a discussion ID, and each inner
         dictionary maps message ID to an informativeness score on a scale from  1 to 5.
+        If return_expected is True, a tuple of this dictionary and the dictionary mapping the discussion ID to the expected label value of each message ID.
     """
 
     validateInputParams(model_type, openAIKEY, model_path, message_list, msgsid_list)
+    validateScoring(scoring, model_type)
 
     dprint("info", f"Building corpus of: {len(message_list)} utterances ")
     timestr = time.strftime("%Y%m%d-%H%M%S")
@@ -122,7 +140,7 @@ def informativeness_response(
             f"Informativeness Score Per Response-Proccessing discussion: {disc_id} with LLM ",
         )
         inform_per_resp = calculate_response_informative_score(
-            utterances, conv_topic, openAIKEY, model_type, llm, ctx
+            utterances, conv_topic, openAIKEY, model_type, llm, ctx, scoring
         )
         infor_per_resp_scores_llm_output_dict[disc_id] = inform_per_resp
         sleep(model_type)
@@ -144,6 +162,7 @@ def informativeness_response(
     """
 
     inform_scores_per_response = {}
+    expected_per_response = {}
     for disc_id, turnAnnotations in infor_per_resp_scores_llm_output_dict.items():
         counter = 0
         ut_dict = {}
@@ -156,6 +175,9 @@ def informativeness_response(
                 dprint("info", label)
                 counter += 1
                 continue
+            if isinstance(label, dict):
+                expected_per_response[str(msgsid_list[counter])] = label["expected"]
+                label = label["response"]
             parts = label.split("informativeness of the new response is:")
 
             value = isValidResponse(parts)
@@ -172,7 +194,16 @@ def informativeness_response(
             counter += 1
         inform_scores_per_response[disc_id] = ut_dict
 
+    if expected_per_response:
+        save_dict_2_json(
+            {disc_id: expected_per_response},
+            "informativeness_expected_per_response",
+            disc_id,
+            timestr,
+        )
     save_dict_2_json(
         inform_scores_per_response, "informativeness_per_response", disc_id, timestr
     )
+    if return_expected:
+        return inform_scores_per_response, {disc_id: expected_per_response}
     return inform_scores_per_response
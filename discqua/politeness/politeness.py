@@ -1,13 +1,108 @@
 import sys
 import time
 
-from convokit import Corpus, PolitenessStrategies, TextParser
+from discqua.utils import dprint, get_parse_store, save_dict_2_json
 
-from discqua.utils import dprint, getUtterances, save_dict_2_json
+_SPACY_MODEL = "en_core_web_sm"
+
+_SPACY_NLP = None
+
+
+def _spacy_nlp():
+    """Returns the spaCy pipeline used by convokit's TextParser, loaded once and kept
+    across calls."""
+    global _SPACY_NLP
+    if _SPACY_NLP is None:
+        import spacy
+
+        try:
+            _SPACY_NLP = spacy.load(_SPACY_MODEL, disable=["ner"])
+        except OSError:
+            print(
+                "Politeness requires the SpaCy model en_core_web_sm. Run `python -m spacy download en_core_web_sm` and retry. Exiting"
+            )
+            sys.exit(1)
+    return _SPACY_NLP
+
+
+def _parser_id():
+    # parses are stored per model version, so that a new model parses the texts again
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return f"convokit-parse:{_SPACY_MODEL}=={version(_SPACY_MODEL)}"
+    except PackageNotFoundError:
+        return f"convokit-parse:{_SPACY_MODEL}"
+
+
+def _parse(doc):
+    # the parse of convokit's TextParser, with token indices relative to the utterance
+    from convokit.text_processing.textParser import _process_sentence
+
+    sentences = []
+    offset = 0
+    for sent in doc.sents:
+        sentence = _process_sentence(sent, "parse", offset)
+        sentences.append(sentence)
+        offset += len(sentence["toks"])
+    return sentences
+
+
+def politeness_strategies(message_list, n_process=1):
+    """Extracts the politeness strategies of each utterance of a discussion.
+
+    The utterances are parsed in a single batched spaCy call and the strategies are
+    extracted once per utterance, as convokit's TextParser and PolitenessStrategies
+    annotate a corpus. If a parse store is set with set_parse_store, the stored parses
+    are reused and only the remaining utterances are parsed.
+
+    Args:
+        message_list (list[str]): The list of utterances in the discussion.
+        n_process (int): Number of processes parsing the utterances. Defaults to 1.
+
+    Returns:
+        list[dict]: For each utterance, the presence (0 or 1) of each politeness strategy.
+    """
+    from convokit.politeness_collections.politeness_api.features.politeness_strategies import (
+        get_politeness_strategy_features,
+    )
+
+    texts = [str(message).strip() for message in message_list]
+    store = get_parse_store()
+    parser_id = _parser_id()
+    parses = (
+        store.get_many(parser_id, texts) if store is not None else [None] * len(texts)
+    )
+    missing = [i for i, parsed in enumerate(parses) if parsed is None]
+    if missing:
+        nlp = _spacy_nlp()
+        docs = nlp.pipe([texts[i] for i in missing], n_process=n_process)
+        for i, doc in zip(missing, docs):
+            parses[i] = _parse(doc)
+        if store is not None:
+            store.put_many(parser_id, [(texts[i], parses[i]) for i in missing])
+    strategies = []
+    for parsed in parses:
+        tokens = [
+            [dict(token, tok=token["tok"].lower()) for token in sentence["toks"]]
+            for sentence in parsed
+        ]
+        features, _ = get_politeness_strategy_features(tokens)
+        strategies.append(features)
+    return strategies
+
+
+def _summarize(strategies):
+    # share of the utterances using each strategy, as PolitenessStrategies.summarize()
+    names = list(dict.fromkeys(name for features in strategies for name in features))
+    return {
+        name: sum(features.get(name, 0) for features in strategies) / len(strategies)
+        for name in names
+    }
 
 
 def politeness_ngrams(
-    message_list, speakers_list, msgsid_list, disc_id, discussion_level
+    message_list, speakers_list, msgsid_list, disc_id, discussion_level, n_process=1
 ):
     """Annotates a discussion with politeness markers based on the framework presented by Danescu-Niculescu-Mizil et al. (2013, August),
     either at the discussion level or at the utterance level.
@@ -18,6 +113,7 @@ def politeness_ngrams(
         msgsid_list (list[str]) : List of messages ids corresponding to each utterance.
         disc_id (str): Unique identifier for the discussion.
         discussion_level (bool): A boolean flag; if True, the annotations are applied at the discussion level; otherwise at the utterance level.
+        n_process (int): Number of processes parsing the utterances with spaCy. Defaults to 1.
 
     Returns:
         dict: If discussion_level=True, returns a dictionary mapping the discussion ID to an aggregated politeness strategy summary.
@@ -26,41 +122,29 @@ def politeness_ngrams(
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
+    if len(message_list) != len(speakers_list):
+        print("The lengths of 'message_list' and 'speakers_list' do not match")
+        sys.exit(1)
     timestr = time.strftime("%Y%m%d-%H%M%S")
-    utterances, speakers = getUtterances(message_list, speakers_list, disc_id)
+    dprint("info", f"Politeness-Parsing {len(message_list)} utterances")
+    # the discussion is parsed once, and the strategies of each utterance are reused by
+    # both levels
+    strategies = politeness_strategies(message_list, n_process)
     if discussion_level:
-        corpus = Corpus(utterances=utterances)
-        dprint("info", "Corpus created successfully.")
-        # corpus.print_summary_stats()
         politeness_per_disc = {}
-        parser = TextParser()
-        corpus = parser.transform(corpus)
-        politeness_transformer = PolitenessStrategies()
-        corpus = politeness_transformer.transform(corpus, markers=True)
-        data = politeness_transformer.summarize(corpus, plot=False)
-        politeness_per_disc[disc_id] = dict(data)
+        politeness_per_disc[disc_id] = _summarize(strategies)
         save_dict_2_json(politeness_per_disc, "politeness_per_disc", disc_id, timestr)
         return politeness_per_disc
     else:
         politenes_per_utt = {}
-        for utterance_index, utterance_iter in enumerate(utterances):
-            corpus = Corpus(
-                utterances=utterances[utterance_index : utterance_index + 1]
-            )
-            # print("Corpus for utterances created successfully.")
-            # corpus.print_summary_stats()
-            parser = TextParser()
-            corpus = parser.transform(corpus)
-            politeness_transformer = PolitenessStrategies()
-            corpus = politeness_transformer.transform(corpus, markers=True)
-            data = politeness_transformer.summarize(corpus, plot=False)
+        for utterance_index, features in enumerate(strategies):
             if disc_id in politenes_per_utt:
                 politenes_per_utt[disc_id].append(
-                    {str(msgsid_list[utterance_index]): dict(data)}
+                    {str(msgsid_list[utterance_index]): _summarize([features])}
                 )
             else:
                 politenes_per_utt[disc_id] = [
-                    {str(msgsid_list[utterance_index]): dict(data)}
+                    {str(msgsid_list[utterance_index]): _summarize([features])}
                 ]
         save_dict_2_json(politenes_per_utt, "politeness_per_utt", disc_id, timestr)
         return politenes_per_utt
@@ -1,11 +1,14 @@
 import sys
 import time
-from datetime import datetime
 
-from convokit import Coordination, Corpus, Speaker, Utterance
-from dateutil.relativedelta import relativedelta
+from discqua.utils import (
+    dprint,
+    getCorpus,
+    getTimestampedUtterances,
+    save_dict_2_json,
+)
 
-from discqua.utils import dprint, save_dict_2_json
+from .coordination_state import CoordinationState
 
 
 def coordination(
@@ -28,38 +31,18 @@ def coordination(
               -'coord_allspeakers_2_user': Coordination from all speakers toward each user.
               -'coord_user_2_allspeaker': Coordination from each user toward all other speakers.
     """
-
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
-    speakers_unq = set(speakers_list)
-    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
-    utterances = []
-    counter = 0
     timestr = time.strftime("%Y%m%d-%H%M%S")
-    tm = datetime.strptime(timestr, "%Y%m%d-%H%M%S")
-    for utt, speaker, msg_id, rplt in zip(
-        message_list, speakers_list, msgsid_list, replyto_list
-    ):
-        tm = tm + relativedelta(seconds=1)
-        if counter == 0:
-            replyto = None
-        else:
-            replyto = str(rplt)
-        u = Utterance(
-            id=f"{msg_id}",
-            speaker=speakers[speaker],
-            conversation_id=str(disc_id),
-            reply_to=replyto,
-            text=utt,
-            meta={"timestamp": tm},
-        )
-        u.timestamp = tm
-        utterances.append(u)
-        counter += 1
     if discussion_level:
+        from convokit import Coordination
+
+        utterances, speakers = getTimestampedUtterances(
+            message_list, speakers_list, msgsid_list, replyto_list, disc_id
+        )
         output_dict_disc = {}
-        corpus = Corpus(utterances=utterances)
+        corpus = getCorpus(utterances)
         dprint("info", "Corpus created successfully.")
         # corpus.print_summary_stats()
         # conv=corpus.get_conversation(disc_id)
@@ -118,59 +101,19 @@ def coordination(
     else:
         output_dict_all = {}
         output_dict_turn = {}
-        for utter_index, utter in enumerate(utterances):
+        dprint("info", f"Coordination-Proccessing discussion: {disc_id} per utterance")
+        # the marker categories of each utterance are extracted once and the running
+        # tallies are updated by each reply, instead of refitting a corpus per prefix
+        state = CoordinationState()
+        users = list(dict.fromkeys(speakers_list))
+        for utter_index, (message, speaker, msg_id, reply_to) in enumerate(
+            zip(message_list, speakers_list, msgsid_list, replyto_list)
+        ):
+            state.add(msg_id, speaker, message, None if utter_index == 0 else reply_to)
             if utter_index == 0:
                 continue
-            corpus = Corpus(utterances=utterances[0 : utter_index + 1])
-            dprint(
-                "info", f"Corpus for utterances 0 - {utter_index} created successfully."
-            )
-            # corpus.print_summary_stats()
-            coord = Coordination()
-            coord.fit(corpus)
-            coord.transform(corpus)
-            all_speakers = lambda speaker: True
-            user_lamda_list = []
-            for person in speakers.keys():
-                user_lamda_list.append(
-                    {person: (lambda speaker, person=person: speaker.id == person)}
-                )
-            dprint("info", "coordination of all speakers to user")
-            coord_allspeakers_2_user = {}
-            for item in user_lamda_list:
-                user = list(item.keys())[0]
-                lamda_function = list(item.values())[0]
-                dprint("info", f"> coordination of all speakers to user: {user} ")
-                allspeakers_2_user = coord.summarize(
-                    corpus,
-                    all_speakers,
-                    lamda_function,
-                    focus="targets",
-                    target_thresh=1,
-                    summary_report=True,
-                )
-                coord_allspeakers_2_user[user] = allspeakers_2_user
-            dprint("info", "coordination of user to all speakers")
-            coord_user_2_allspeaker = {}
-            for item in user_lamda_list:
-                user = list(item.keys())[0]
-                lamda_function = list(item.values())[0]
-                dprint("info", f"> coordination of user {user} to all speakers ")
-                user_2_allspeakers = coord.summarize(
-                    corpus,
-                    lamda_function,
-                    all_speakers,
-                    focus="speakers",
-                    speaker_thresh=1,
-                    target_thresh=1,
-                    summary_report=True,
-                )
-                coord_user_2_allspeaker[user] = user_2_allspeakers
             key_iter = str(msgsid_list[0]) + "-" + str(msgsid_list[utter_index])
-            output_dict_turn[key_iter] = {
-                "coord_allspeakers_2_user": coord_allspeakers_2_user,
-                "coord_user_2_allspeaker": coord_user_2_allspeaker,
-            }
+            output_dict_turn[key_iter] = state.summary(users)
         if disc_id in output_dict_all:
             output_dict_all[disc_id].append([output_dict_turn])
         else:
@@ -0,0 +1,181 @@
+import os
+
+# coordination marker categories, as in convokit.coordination.CoordinationWordCategories
+MARKERS = (
+    "article",
+    "auxverb",
+    "conj",
+    "adverb",
+    "ppron",
+    "ipron",
+    "preps",
+    "quant",
+)
+
+_WORD_CHARS = set("abcdefghijklmnopqrstuvwxyz0123456789_")
+
+_LIWC_TRIE = None
+
+
+def _liwc_trie():
+    global _LIWC_TRIE
+    if _LIWC_TRIE is None:
+        import convokit
+        from convokit import Coordination
+
+        path = os.path.join(
+            os.path.dirname(convokit.__file__), "data", "coord-liwc-patterns.txt"
+        )
+        words = []
+        with open(path, "r") as f:
+            for line in f:
+                cat, pat = line.strip().split("\t")
+                # "#" marks a word boundary
+                words += [(w[1:], cat) for w in pat.replace("\\b", "#").split("|")]
+        _LIWC_TRIE = Coordination.make_trie(words)
+    return _LIWC_TRIE
+
+
+def marker_categories(text):
+    """Returns the set of coordination marker categories used in `text`, matched as
+    convokit's Coordination annotates utterances."""
+    trie = _liwc_trie()
+    cats = set()
+    last = None
+    cur = None
+    for c in str(text).lower() + " ":
+        # a word after an apostrophe is only matched if the apostrophe starts the word
+        if last not in _WORD_CHARS and c in _WORD_CHARS and (last != "'" or not cur):
+            cur = trie
+        if cur:
+            if c in cur and c != "#" and c != "$":
+                if c not in _WORD_CHARS:
+                    if "#" in cur and "$" in cur["#"]:
+                        cats |= cur["#"]["$"]
+                cur = cur[c]
+            elif c not in _WORD_CHARS and last in _WORD_CHARS and "#" in cur:
+                cur = cur["#"]
+            else:
+                cur = None
+        if cur and "$" in cur:
+            cats |= cur["$"]
+        last = c
+    return cats
+
+
+class _Tally:
+    """Marker counts over a set of (reply, replied utterance) exchanges."""
+
+    def __init__(self):
+        self.n_utterances = 0
+        self.tally = dict.fromkeys(MARKERS, 0)
+        self.cond_total = dict.fromkeys(MARKERS, 0)
+        self.cond_tally = dict.fromkeys(MARKERS, 0)
+
+    def add(self, reply_markers, target_markers):
+        self.n_utterances += 1
+        for cat in MARKERS:
+            if cat in reply_markers:
+                self.tally[cat] += 1
+            if cat in target_markers:
+                self.cond_total[cat] += 1
+                if cat in reply_markers:
+                    self.cond_tally[cat] += 1
+
+    def scores(self):
+        # with speaker_thresh=1 and target_thresh=1, as used by coordination()
+        return {
+            cat: self.cond_tally[cat] / self.cond_total[cat]
+            - self.tally[cat] / self.n_utterances
+            for cat in MARKERS
+            if self.cond_total[cat] >= 1 and self.tally[cat] >= 1
+        }
+
+
+def _summary_report(user, coord_w):
+    from convokit.coordination.coordinationScore import CoordinationScore
+
+    scores = CoordinationScore()
+    if coord_w:
+        scores[user] = coord_w
+    marker = scores.averages_by_marker()
+    return {
+        "marker_agg1": scores.averages_by_marker(strict_thresh=True),
+        "marker_agg2": marker,
+        "marker_agg3": marker,
+        "agg1": scores.aggregate(method=1),
+        "agg2": scores.aggregate(method=2),
+        "agg3": scores.aggregate(method=3),
+        "count_agg1": len([s for s in scores if len(scores[s]) == len(MARKERS)]),
+        "count_agg2": len(scores),
+        "count_agg3": len(scores),
+    }
+
+
+class CoordinationState:
+    """Running linguistic coordination statistics of a discussion, updated one utterance at
+    a time.
+
+    The marker categories of each utterance are extracted once, and each reply adds its
+    marker counts to the tallies of the replying speaker and of the replied speaker. The
+    summaries equal those of convokit's Coordination.summarize() on the discussion so far,
+    as computed by coordination().
+    """
+
+    def __init__(self):
+        self.utterances = {}
+        self.speakers = []
+        self.to_user = {}
+        self.from_user = {}
+        self.waiting = {}
+        self._reports = {}
+
+    def add(self, msg_id, speaker, text, reply_to=None):
+        msg_id = str(msg_id)
+        self.utterances[msg_id] = (speaker, marker_categories(text))
+        if speaker not in self.to_user:
+            self.speakers.append(speaker)
+            self.to_user[speaker] = _Tally()
+            self.from_user[speaker] = _Tally()
+        if reply_to is not None:
+            reply_to = str(reply_to)
+            if reply_to in self.utterances:
+                self._add_reply(msg_id, reply_to)
+            else:
+                # the replied utterance may still join the discussion
+                self.waiting.setdefault(reply_to, []).append(msg_id)
+        for reply in self.waiting.pop(msg_id, []):
+            self._add_reply(reply, msg_id)
+
+    def _add_reply(self, reply, target):
+        speaker, markers = self.utterances[reply]
+        target_speaker, target_markers = self.utterances[target]
+        if target_speaker == speaker:
+            return
+        self.to_user[target_speaker].add(markers, target_markers)
+        self.from_user[speaker].add(markers, target_markers)
+        self._reports.pop(("to", target_speaker), None)
+        self._reports.pop(("from", speaker), None)
+
+    def _report(self, direction, user):
+        key = (direction, user)
+        if key not in self._reports:
+            tallies = self.to_user if direction == "to" else self.from_user
+            tally = tallies.get(user)
+            self._reports[key] = _summary_report(
+                user, tally.scores() if tally is not None else {}
+            )
+        return self._reports[key]
+
+    def summary(self, users=None):
+        """Returns the coordination of all speakers to each user and of each user to all
+        speakers, for `users` or for every speaker seen so far."""
+        users = self.speakers if users is None else users
+        return {
+            "coord_allspeakers_2_user": {
+                user: self._report("to", user) for user in users
+            },
+            "coord_user_2_allspeaker": {
+                user: self._report("from", user) for user in users
+            },
+        }
@@ -1,16 +1,16 @@
 # -*- coding: utf-8 -*-
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     extractFeature,
     getModel,
     getUtterances,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
     sleep,
+    static_prefix,
     validateInputParams,
 )
 
@@ -60,11 +60,14 @@ For clarity, your response should succinctly be presented in a structured list f
 """
 
 
+output_spec = OutputSpec.labels(6)
+
+
 def calculate_social_bias_labels(utts, topic, openAIKEY, model_type, model, ctx):
 
     prompt = ini + social_bias_labels + final
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -82,11 +85,18 @@ def calculate_social_bias_labels(utts, topic, openAIKEY, model_type, model, ctx)
                 post=topic,
             )
             # print(formatted_prompt)
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    annotations_ci = prompt_batch(
+        prompts,
+        openAIKEY,
+        model_type,
+        model,
+        output=output_spec,
+        prefix=static_prefix(prompt),
+    )
     return annotations_ci
 
 
@@ -1 +1,2 @@
+from .readability_bulk import readability_bulk
 from .readability_indices import readability
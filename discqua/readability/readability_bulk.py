@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+
+from discqua.utils import dprint, save_dict_2_json
+
+from .readability_indices import readability_counts
+from .syllable_index import get_stopwords, get_syllable_index, set_syllable_index
+
+
+def _iter_utterances(utterances):
+    # (disc_id, msg_id, text) triples of a mapping of discussions, or of a flat iterable
+    # of (msg_id, text) pairs
+    if isinstance(utterances, Mapping):
+        for disc_id, (message_list, msgsid_list) in utterances.items():
+            for msg_id, text in zip(msgsid_list, message_list):
+                yield disc_id, msg_id, text
+    else:
+        for msg_id, text in utterances:
+            yield None, msg_id, text
+
+
+def _count_chunk(texts):
+    return [readability_counts(str(text)) for text in texts]
+
+
+def readability_indices(words, sentences, complex_words, syllables):
+    """Computes the readability indices from the per-utterance counts of words, sentences,
+    complex words and syllables, as NumPy arrays. Utterances without words or sentences
+    score 0 on every index.
+
+    Returns:
+        dict: The Gunning_Fog, Smog, Flesch and Flesch_Kincaid arrays.
+    """
+    import numpy as np
+
+    words = np.asarray(words, dtype=float)
+    sentences = np.asarray(sentences, dtype=float)
+    complex_words = np.asarray(complex_words, dtype=float)
+    syllables = np.asarray(syllables, dtype=float)
+    valid = (words > 0) & (sentences > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        words_per_sentence = words / sentences
+        syllables_per_word = syllables / words
+        indices = {
+            "Gunning_Fog": 0.4 * (words_per_sentence + (100 * (complex_words / words))),
+            "Smog": 1.0430 * np.sqrt(complex_words * (30 / sentences)) + 3.1291,
+            "Flesch": 206.835 - 1.015 * words_per_sentence - 84.6 * syllables_per_word,
+            "Flesch_Kincaid": 0.39 * words_per_sentence
+            + 11.8 * syllables_per_word
+            - 15.59,
+        }
+    return {name: np.where(valid, values, 0.0) for name, values in indices.items()}
+
+
+def readability_bulk(utterances, processes=None, chunk_size=256):
+    """Calculates the readability indices (Gunning Fog Index, SMOG Index, Flesch Reading Ease
+    and Flesch-Kincaid) of the utterances of many discussions.
+
+    The utterances are tokenized in a process pool, in chunks of `chunk_size` utterances,
+    and the indices are computed at once over the per-utterance counts.
+
+    Args:
+        utterances (dict or iterable): A dictionary mapping each discussion ID to a (message_list, msgsid_list) pair, or an iterable of (msg_id, text) pairs.
+        processes (int): Number of worker processes. Defaults to the number of CPUs; with 0 or 1, the utterances are processed in the calling process.
+        chunk_size (int): Number of utterances per work unit. Defaults to 256.
+
+    Returns:
+        dict: The columnar results, in the order of the utterances: the disc_id and msg_id lists (disc_id is None for an iterable of pairs),
+              and the Gunning_Fog, Smog, Flesch and Flesch_Kincaid NumPy arrays.
+    """
+    import numpy as np
+
+    if isinstance(utterances, Mapping):
+        for disc_id, (message_list, msgsid_list) in utterances.items():
+            if len(message_list) != len(msgsid_list):
+                print(
+                    f"The lengths of 'message_list' and 'msgsid_list' of discussion {disc_id} do not match"
+                )
+                sys.exit(1)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    chunk_size = max(1, int(chunk_size))
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    # loaded once, before the workers start, which receive them from this process
+    index = get_syllable_index()
+    stopwords = get_stopwords()
+
+    disc_ids = []
+    msg_ids = []
+    counts = []
+
+    def chunks():
+        items = _iter_utterances(utterances)
+        while True:
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                return
+            for disc_id, msg_id, _ in chunk:
+                disc_ids.append(disc_id)
+                msg_ids.append(str(msg_id))
+            yield [text for _, _, text in chunk]
+
+    if processes <= 1:
+        for texts in chunks():
+            counts.extend(_count_chunk(texts))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # a bounded number of chunks is in flight, so that the utterances are read lazily
+        pending = deque()
+        with ProcessPoolExecutor(
+            processes, initializer=set_syllable_index, initargs=(index, stopwords)
+        ) as pool:
+            for texts in chunks():
+                pending.append(pool.submit(_count_chunk, texts))
+                if len(pending) >= 2 * processes:
+                    counts.extend(pending.popleft().result())
+            while pending:
+                counts.extend(pending.popleft().result())
+    dprint("info", f"Readability-Processed {len(counts)} utterances")
+
+    counts = np.array(counts, dtype=float).reshape(-1, 4)
+    results = {"disc_id": disc_ids, "msg_id": msg_ids}
+    results.update(readability_indices(*counts.T))
+    save_dict_2_json(
+        {
+            name: values.tolist() if hasattr(values, "tolist") else values
+            for name, values in results.items()
+        },
+        "readability_indices_bulk",
+        "corpus",
+        timestr,
+    )
+    return results
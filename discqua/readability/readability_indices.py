@@ -1,54 +1,40 @@
 # -*- coding: utf-8 -*-
 import math
-import os
 import sys
 import time
 
-import nltk
 import regex as re
-from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
 
 from discqua.utils import dprint, save_dict_2_json
 
+from .syllable_index import get_stopwords, get_syllable_index, syllable_count
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+def readability_counts(text):
+    """Returns the number of words, sentences, complex words (more than two syllables) and
+    syllables of a text, from which the readability indices are computed."""
+    from nltk.tokenize import sent_tokenize, word_tokenize
 
-def syllable_count(word, stopwords_list, pronouncing_dict):
-    word = word.lower()
-    if (
-        word in pronouncing_dict
-        and word not in stopwords.words("english")
-        and word not in stopwords_list
-    ):
-        syllable_list = [
-            len(list(y for y in x if y[-1].isdigit())) for x in pronouncing_dict[word]
-        ]
-        return max(syllable_list)
-    else:
-        return 0
-
-
-def calculate_gunning_fog_smog_fleschkincaid_index(
-    text, stopwords_list, pronouncing_dict
-):
     sentences = sent_tokenize(text)
     words = word_tokenize(text)
 
     # Filter out punctuation and stopwords
+    syllable_words = [syllable_count(word) for word in words]
     complex_words = [
         word
-        for word in words
-        if re.match(r"[A-Za-z]+", word)
-        and syllable_count(word, stopwords_list, pronouncing_dict) > 2
-    ]
-    syllable_words = [
-        syllable_count(word, stopwords_list, pronouncing_dict) for word in words
+        for word, syllables in zip(words, syllable_words)
+        if syllables > 2 and _WORD_RE.match(word)
     ]
+    return len(words), len(sentences), len(complex_words), sum(syllable_words)
 
+
+def calculate_gunning_fog_smog_fleschkincaid_index(text):
     # Total number of words and sentences
-    total_words = len(words)
-    total_sentences = len(sentences)
-    total_complex_words = len(complex_words)
-    total_syllable_words = sum(syllable_words)
+    total_words, total_sentences, total_complex_words, total_syllable_words = (
+        readability_counts(text)
+    )
 
     if total_words == 0 or total_sentences == 0:
         return 0, 0, 0, 0
@@ -90,16 +76,10 @@ def readability(message_list, msgsid_list, disc_id):
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
-    nltk.download("cmudict")
-    pronouncing_dict = nltk.corpus.cmudict.dict()
-
-    stopwords_list = []
-    script_dir = os.path.dirname(__file__)  # Directory of the current script
-    file_path = os.path.join(script_dir, "stopwords", "StopWords_Generic.txt")
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        for word in f.read().splitlines():
-            stopwords_list.append(word.lower())
+    # the syllable index and the stopwords are loaded once per process, and the syllable
+    # count of each token is memoized across utterances and calls
+    get_syllable_index()
+    get_stopwords()
     dprint("info", f"Building corpus of: {len(message_list)} utterances ")
     timestr = time.strftime("%Y%m%d-%H%M%S")
     utt_dict = {}
@@ -112,9 +92,7 @@ def readability(message_list, msgsid_list, disc_id):
             )
             #
             gunning_fog_index, smog_index, Flesch_index, Flesch_Kincaid_index = (
-                calculate_gunning_fog_smog_fleschkincaid_index(
-                    utt, stopwords_list, pronouncing_dict
-                )
+                calculate_gunning_fog_smog_fleschkincaid_index(utt)
             )
             key_iter = str(msgsid_list[i])
             utt_dict[key_iter] = {
@@ -0,0 +1,166 @@
+import array
+import bisect
+import gzip
+import os
+from functools import lru_cache
+
+_INDEX_NAME = "cmudict_syllables.bin.gz"
+
+# an index shipped with the package, if any
+_PACKAGED_INDEX_PATH = os.path.join(os.path.dirname(__file__), "syllables", _INDEX_NAME)
+
+_MAGIC = b"DQSYL1\n"
+
+_SYLLABLE_INDEX = None
+
+_STOPWORDS = None
+
+
+class SyllableIndex:
+    """Number of syllables of each word of the CMU pronouncing dictionary, kept as a sorted
+    word list and an array of counts (the maximum over the pronunciations of a word).
+
+    Args:
+        words (list[str]): The words, sorted.
+        counts (array.array): The number of syllables of each word.
+    """
+
+    def __init__(self, words, counts):
+        self.words = words
+        self.counts = counts
+
+    @classmethod
+    def from_cmudict(cls, pronouncing_dict):
+        words = sorted(pronouncing_dict)
+        counts = array.array(
+            "B",
+            (
+                min(
+                    255,
+                    max(
+                        len([phone for phone in pron if phone[-1].isdigit()])
+                        for pron in pronouncing_dict[word]
+                    ),
+                )
+                for word in words
+            ),
+        )
+        return cls(words, counts)
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError(f"Not a syllable index: {path}")
+        header_end = data.index(b"\n", len(_MAGIC))
+        n = int(data[len(_MAGIC) : header_end])
+        counts = array.array("B", data[header_end + 1 : header_end + 1 + n])
+        words = data[header_end + 1 + n :].decode("utf-8").split("\n")
+        return cls(words, counts)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "wb") as f:
+            f.write(_MAGIC)
+            f.write(b"%d\n" % len(self.counts))
+            f.write(self.counts.tobytes())
+            f.write("\n".join(self.words).encode("utf-8"))
+
+    def get(self, word):
+        """Returns the number of syllables of `word`, or None if it is not in the dictionary."""
+        i = bisect.bisect_left(self.words, word)
+        if i < len(self.words) and self.words[i] == word:
+            return self.counts[i]
+        return None
+
+    def __len__(self):
+        return len(self.words)
+
+
+def index_path():
+    """Returns the path of the syllable index in the user cache directory: $DISCQUA_CACHE_DIR,
+    or discqua under $XDG_CACHE_HOME (by default ~/.cache)."""
+    directory = os.environ.get("DISCQUA_CACHE_DIR")
+    if not directory:
+        directory = os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+            "discqua",
+        )
+    return os.path.join(directory, _INDEX_NAME)
+
+
+def build_syllable_index(path=None):
+    """Builds the syllable index from NLTK's CMU pronouncing dictionary and saves it to
+    `path` (by default in the user cache directory), from which it is loaded by the next
+    runs.
+    """
+    import nltk
+
+    if path is None:
+        path = index_path()
+    try:
+        pronouncing_dict = nltk.corpus.cmudict.dict()
+    except LookupError:
+        nltk.download("cmudict", quiet=True)
+        pronouncing_dict = nltk.corpus.cmudict.dict()
+    index = SyllableIndex.from_cmudict(pronouncing_dict)
+    try:
+        index.save(path)
+    except OSError:
+        # e.g. an unwritable cache directory: the index is rebuilt by the next run
+        pass
+    return index
+
+
+def get_syllable_index():
+    """Returns the syllable index, loaded once, or built from the CMU pronouncing dictionary
+    if it is not saved yet."""
+    global _SYLLABLE_INDEX
+    if _SYLLABLE_INDEX is None:
+        for path in (_PACKAGED_INDEX_PATH, index_path()):
+            if os.path.exists(path):
+                _SYLLABLE_INDEX = SyllableIndex.load(path)
+                break
+        else:
+            _SYLLABLE_INDEX = build_syllable_index()
+    return _SYLLABLE_INDEX
+
+
+def set_syllable_index(index, stopwords=None):
+    """Installs an index loaded by another process, e.g. in the workers of a process pool,
+    so that they do not load or build it again."""
+    global _SYLLABLE_INDEX, _STOPWORDS
+    _SYLLABLE_INDEX = index
+    if stopwords is not None:
+        _STOPWORDS = stopwords
+
+
+def get_stopwords():
+    """Returns the stopwords excluded from the syllable counts, the NLTK English stopwords
+    and the generic stopword list, loaded once."""
+    global _STOPWORDS
+    if _STOPWORDS is None:
+        from nltk.corpus import stopwords
+
+        file_path = os.path.join(
+            os.path.dirname(__file__), "stopwords", "StopWords_Generic.txt"
+        )
+        with open(file_path, "r", encoding="utf-8") as f:
+            generic = [word.lower() for word in f.read().splitlines()]
+        _STOPWORDS = frozenset(stopwords.words("english")) | frozenset(generic)
+    return _STOPWORDS
+
+
+@lru_cache(maxsize=1 << 18)
+def syllable_count(word):
+    """Returns the number of syllables of a token, 0 for stopwords and unknown words."""
+    word = word.lower()
+    if word in get_stopwords():
+        return 0
+    return get_syllable_index().get(word) or 0
+
+
+if __name__ == "__main__":
+    index = build_syllable_index()
+    print(f"Saved the syllables of {len(index)} words to {index_path()}")
@@ -0,0 +1 @@
+from .session import DiscussionSession
@@ -0,0 +1,114 @@
+import sys
+
+from discqua.controversy.controversy import (
+    RollingStd,
+    clean_utterance,
+    sentiment_score,
+)
+from discqua.engagement.reciprocity_motifs import ReciprocityMotifs
+from discqua.powerstatus_socialbias.coordination_state import CoordinationState
+from discqua.turnTaking.balanced_participation import ParticipationState
+from discqua.utils import dprint, getModel
+
+MEASURES = ("participation", "coordination", "reciprocity", "controversy")
+
+
+class DiscussionSession:
+    """Evaluates a live discussion one utterance at a time.
+
+    Each measure keeps a running state that is updated by add_utterance(), so that the
+    per-turn values are emitted without recomputing the discussion so far: the cost of an
+    utterance does not grow with the length of the discussion. The values are those of the
+    per-utterance modes (discussion_level=False) of participation(), coordination(),
+    reciprocity() and controversy() on the discussion so far, except that the normalized
+    controversy uses the range of the sentiment scores seen so far, since the range over
+    the whole discussion is not known yet.
+
+    Args:
+        disc_id (str): Unique identifier for the discussion.
+        metrics (list[str]): The measures to keep up to date, among "participation", "coordination", "reciprocity" and "controversy". Defaults to all of them.
+        device (str): The device to load the sentiment model of controversy on. Defaults to auto.
+    """
+
+    def __init__(self, disc_id, metrics=MEASURES, device="auto"):
+        metrics = list(dict.fromkeys(metrics))
+        unknown = [name for name in metrics if name not in MEASURES]
+        if unknown or not metrics:
+            print(f"Expected measures among: {', '.join(MEASURES)}. Exiting")
+            sys.exit(1)
+        self.disc_id = disc_id
+        self.metrics = metrics
+        self.device = device
+        self.first_id = None
+        self.last_id = None
+        self.n_utterances = 0
+        self.participation = ParticipationState()
+        self.coordination = CoordinationState()
+        self.reciprocity = ReciprocityMotifs(prefix_len=40)
+        self.sentiment_std = RollingStd()
+        self.sentiment_min = None
+        self.sentiment_max = None
+        self.pipe = None
+
+    def add_utterance(self, text, speaker, msg_id=None, reply_to=None):
+        """Adds an utterance to the discussion and returns the values of the measures on the discussion so far.
+
+        Args:
+            text (str): The utterance.
+            speaker (str): The speaker of the utterance.
+            msg_id (str): Message id of the utterance. Defaults to its position in the discussion.
+            reply_to (str): Message id of the utterance it replies to. Defaults to the previous utterance.
+
+        Returns:
+            dict: The values of the measures after this utterance, keyed by measure name, along with "msg_id" and "key", the window of the discussion so far (first message id-current message id). Participation, coordination and reciprocity are emitted from the second utterance on, like in their per-utterance modes.
+        """
+        if msg_id is None:
+            msg_id = str(self.n_utterances)
+        msg_id = str(msg_id)
+        if reply_to is None:
+            reply_to = self.last_id
+        if self.first_id is None:
+            self.first_id = msg_id
+            reply_to = None
+        self.last_id = msg_id
+        self.n_utterances += 1
+
+        values = {"msg_id": msg_id, "key": f"{self.first_id}-{msg_id}"}
+        if "participation" in self.metrics:
+            self.participation.add(speaker, text)
+        if "coordination" in self.metrics:
+            self.coordination.add(msg_id, speaker, text, reply_to)
+        if "reciprocity" in self.metrics:
+            self.reciprocity.add(msg_id, speaker, reply_to)
+        if "controversy" in self.metrics:
+            values["controversy"] = self._controversy(text)
+        if self.n_utterances > 1:
+            if "participation" in self.metrics:
+                values["participation"] = self.participation.entropy()
+            if "coordination" in self.metrics:
+                values["coordination"] = self.coordination.summary()
+            if "reciprocity" in self.metrics:
+                values["reciprocity"] = self.reciprocity.features()
+        return values
+
+    def _controversy(self, text):
+        if self.pipe is None:
+            dprint(
+                "info", f"Controversy-Loading sentiment model for disc: {self.disc_id}"
+            )
+            self.pipe = getModel(
+                model_path="", gpu=True, model_type="controversy", device=self.device
+            )
+        score = sentiment_score(self.pipe, clean_utterance(text))
+        std = self.sentiment_std.add(score)
+        if self.sentiment_min is None:
+            self.sentiment_min = self.sentiment_max = score
+        self.sentiment_min = min(self.sentiment_min, score)
+        self.sentiment_max = max(self.sentiment_max, score)
+        spread = self.sentiment_max - self.sentiment_min
+        # the std of the min-max normalized scores is the std of the scores over their range
+        return {
+            "sentiment": score,
+            "unorm": std,
+            "norm": std / spread if spread > 0 else 0.0,
+        }
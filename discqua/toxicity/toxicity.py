@@ -1,17 +1,18 @@
 # -*- coding: utf-8 -*-
 import time
 
-from tqdm import tqdm
-
 from discqua.utils import (
+    OutputSpec,
     dprint,
     getModel,
     getUtterances,
     isValidResponse,
-    prompt_gpt4,
+    prompt_batch,
     save_dict_2_json,
+    score_labels,
     sleep,
     validateInputParams,
+    validateScoring,
 )
 
 prompt = """
@@ -33,9 +34,18 @@ Please, ensure that your last statement is the label in brackets [].
 """
 
 
-def calculate_response_toxicity_score(utts, topic, openAIKEY, model_type, model, ctx):
-    annotations_ci = []
-    for index, utt in enumerate(tqdm(utts, desc="Processing utterances")):
+output_spec = OutputSpec.label()
+
+answer_prefix = "The toxicity of the new utterance is: ["
+
+rating_labels = ["1", "2", "3", "4", "5"]
+
+
+def calculate_response_toxicity_score(
+    utts, topic, openAIKEY, model_type, model, ctx, scoring="generate"
+):
+    prompts = []
+    for index, utt in enumerate(utts):
         conv_hist = ""
         text = utt.text
         speaker = utt.get_speaker().id
@@ -54,11 +64,15 @@ def calculate_response_toxicity_score(utts, topic, openAIKEY, model_type, model,
                 post=topic,
             )
             # print(formatted_prompt)
-            response_text = prompt_gpt4(formatted_prompt, openAIKEY, model_type, model)
-            annotations_ci.append(response_text)
+            prompts.append(formatted_prompt)
         except Exception as e:
             print("Error: ", e)
-            annotations_ci.append(-1)
+            prompts.append(None)
+    if scoring == "logits":
+        return score_labels(prompts, model, answer_prefix, rating_labels)
+    annotations_ci = prompt_batch(
+        prompts, openAIKEY, model_type, model, output=output_spec
+    )
     return annotations_ci
 
 
@@ -74,6 +88,8 @@ def toxicity(
     gpu=False,
     ctx=1,
     device="auto",
+    scoring="generate",
+    return_expected=False,
 ):
     """Evaluates the toxicity level of each utterance in a discussion using a selected language model, with optional context from previous utterances.
 
@@ -89,12 +105,16 @@ def toxicity(
         gpu (bool): A boolean flag; if True, utilizes GPU (when available); otherwise defaults to CPU. Defaults to False.
         ctx (int): Number of previous utterances to include as context for each input. Defaults to 1.
         device(str): The device to load the model on. If None, the device will be inferred. Defaults to auto.
+        scoring (str): "generate" to decode the answer, or "logits" to score the candidate labels with a single forward pass, for transformers models only. Defaults to "generate".
+        return_expected (bool): If True, the expected value of the label of each utterance under the label probabilities is returned as well, for scoring "logits" only. Defaults to False.
 
     Returns:
         dict: A dictionary mapping each message ID to its associated toxicity label, structured per discussion ID.
+        If return_expected is True, a tuple of this dictionary and the dictionary mapping the discussion ID to the expected label value of each message ID.
     """
 
     validateInputParams(model_type, openAIKEY, model_path, message_list, msgsid_list)
+    validateScoring(scoring, model_type)
     dprint("info", f"Building corpus of: {len(message_list)} utterances ")
     timestr = time.strftime("%Y%m%d-%H%M%S")
     llm = None
@@ -115,7 +135,7 @@ def toxicity(
         )
         #
         tox_per_resp = calculate_response_toxicity_score(
-            utterances, conv_topic, openAIKEY, model_type, llm, ctx
+            utterances, conv_topic, openAIKEY, model_type, llm, ctx, scoring
         )
         tox_per_resp_scores_llm_output_dict[disc_id] = tox_per_resp
         #
@@ -138,6 +158,7 @@ def toxicity(
     """
 
     toxicity_scores_per_response = {}
+    expected_per_response = {}
     for disc_id, turnAnnotations in tox_per_resp_scores_llm_output_dict.items():
         counter = 0
         ut_dict = {}
@@ -150,6 +171,9 @@ def toxicity(
                 dprint("info", label)
                 counter += 1
                 continue
+            if isinstance(label, dict):
+                expected_per_response[str(msgsid_list[counter])] = label["expected"]
+                label = label["response"]
             parts = label.split("toxicity of the new utterance is:")
             value = isValidResponse(parts)
             if value == -1:
@@ -165,7 +189,16 @@ def toxicity(
             counter += 1
         toxicity_scores_per_response[disc_id] = ut_dict
 
+    if expected_per_response:
+        save_dict_2_json(
+            {disc_id: expected_per_response},
+            "toxicity_expected_per_response",
+            disc_id,
+            timestr,
+        )
     save_dict_2_json(
         toxicity_scores_per_response, "toxicity_per_response", disc_id, timestr
     )
+    if return_expected:
+        return toxicity_scores_per_response, {disc_id: expected_per_response}
     return toxicity_scores_per_response
@@ -2,17 +2,144 @@ import math
 import sys
 import time
 
-from discqua.utils import dprint, getUtterances, save_dict_2_json
+from discqua.utils import (
+    dprint,
+    get_saving_enabled,
+    getUtterances,
+    save_dict_2_json,
+)
 
 
 def compute_balance(contributions):
+    contributions = list(contributions)
     total_contributions = sum(contributions)
+    # a single speaker, or no words at all, is taken as fully unbalanced
+    if len(contributions) < 2 or total_contributions == 0:
+        return 0.0
     proportions = [c / total_contributions for c in contributions]
     balance = -sum(p * math.log(p, len(proportions)) for p in proportions if p > 0)
     return balance
 
 
-def participation(message_list, speakers_list, msgsid_list, disc_id, discussion_level):
+def _xlogx(count):
+    return count * math.log(count) if count > 0 else 0.0
+
+
+class ParticipationState:
+    """Running message and word counts per speaker of a discussion, updated one utterance at
+    a time. The sums S = sum(c * log(c)) of the counts are kept up to date, so that the
+    normalized entropy log(T) - S / T of each count distribution is available in O(1).
+    """
+
+    def __init__(self):
+        self.messages = {}
+        self.words = {}
+        self.total_messages = 0
+        self.total_words = 0
+        self.s_messages = 0.0
+        self.s_words = 0.0
+
+    def add(self, speaker, text):
+        n_words = len(str(text).split())
+        messages = self.messages.get(speaker, 0)
+        words = self.words.get(speaker, 0)
+        self.s_messages += _xlogx(messages + 1) - _xlogx(messages)
+        self.s_words += _xlogx(words + n_words) - _xlogx(words)
+        self.messages[speaker] = messages + 1
+        self.words[speaker] = words + n_words
+        self.total_messages += 1
+        self.total_words += n_words
+
+    def _balance(self, total, s):
+        # entropy normalized by its maximum, log(number of speakers); 0 for a single speaker
+        n_speakers = len(self.messages)
+        if n_speakers < 2 or total == 0:
+            return 0.0
+        return (math.log(total) - s / total) / math.log(n_speakers)
+
+    def entropy(self):
+        return {
+            "entropy_number_of_messages": self._balance(
+                self.total_messages, self.s_messages
+            ),
+            "entropy_number_of_words": self._balance(self.total_words, self.s_words),
+        }
+
+
+def _xlogx_array(counts):
+    import numpy as np
+
+    counts = np.asarray(counts, dtype=float)
+    return counts * np.log(np.maximum(counts, 1.0))
+
+
+def entropy_per_turn(message_list, speakers_list):
+    """Computes with NumPy the normalized entropies of the message and word counts per
+    speaker of every prefix of a discussion, as kept up to date by ParticipationState.
+
+    Args:
+        message_list (list[str]): The list of utterances in the discussion.
+        speakers_list (list[str]): The corresponding list of speakers for each utterance.
+
+    Returns:
+        tuple: Two arrays, the entropy of the number of messages and of the number of words
+        of the prefix ending at each utterance.
+    """
+    import numpy as np
+
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(speaker, len(index)) for speaker in speakers_list),
+        dtype=np.int64,
+        count=len(speakers_list),
+    )
+    words = np.fromiter(
+        (len(str(message).split()) for message in message_list),
+        dtype=np.int64,
+        count=len(message_list),
+    )
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0), np.zeros(0)
+    # running counts of the speaker of each utterance, after that utterance
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+    sorted_words = words[order]
+    cum_words = np.cumsum(sorted_words)
+    messages_after = np.empty(n, dtype=np.int64)
+    words_after = np.empty(n, dtype=np.int64)
+    messages_after[order] = np.arange(n) - group_start + 1
+    words_after[order] = cum_words - cum_words[group_start] + sorted_words[group_start]
+
+    n_speakers = np.cumsum(messages_after == 1)
+
+    def balance(after, increment):
+        total = np.cumsum(increment)
+        s = np.cumsum(_xlogx_array(after) - _xlogx_array(after - increment))
+        valid = (n_speakers >= 2) & (total > 0)
+        result = np.zeros(n)
+        safe_total = np.where(valid, total, 1)
+        result[valid] = (
+            (np.log(safe_total) - s / safe_total) / np.log(np.maximum(n_speakers, 2))
+        )[valid]
+        return result
+
+    return (
+        balance(messages_after, np.ones(n, dtype=np.int64)),
+        balance(words_after, words),
+    )
+
+
+def participation(
+    message_list,
+    speakers_list,
+    msgsid_list,
+    disc_id,
+    discussion_level,
+    vectorized=False,
+):
     """Computes participation balance metrics by analyzing the number of messages and total words contributed by each speaker.
     These metrics are used to calculate entropy-based indicators of participation equality.
     Args:
@@ -21,6 +148,7 @@ def participation(message_list, speakers_list, msgsid_list, disc_id, discussion_
         msgsid_list (list[str]) : List of messages ids corresponding to each utterance.
         disc_id (str): Unique identifier for the discussion.
         discussion_level (bool): A boolean flag; if True, the annotations are applied at the discussion level; otherwise at the utterance level.
+        vectorized (bool): A boolean flag; if True, the per-turn entropies are computed over the whole discussion with NumPy; otherwise updated one utterance at a time. Defaults to False.
 
     Returns:
         dict: A dictionary containing entropy values for each discussion or each turn:
@@ -30,9 +158,12 @@ def participation(message_list, speakers_list, msgsid_list, disc_id, discussion_
     if len(message_list) != len(msgsid_list):
         print("The lengths of 'message_list' and 'msgsid_list' do not match")
         sys.exit(1)
-    utterances, speakers = getUtterances(message_list, speakers_list, disc_id)
+    if len(message_list) != len(speakers_list):
+        print("The lengths of 'message_list' and 'speakers_list' do not match")
+        sys.exit(1)
     timestr = time.strftime("%Y%m%d-%H%M%S")
     if discussion_level:
+        utterances, speakers = getUtterances(message_list, speakers_list, disc_id)
         disc_speakers_messages_dict = {}
         disc_number_of_messages_dict = {}
         disc_sum_number_of_words_dict = {}
@@ -92,83 +223,52 @@ def participation(message_list, speakers_list, msgsid_list, disc_id, discussion_
             )
         return entropy_per_discussion
     else:
-        output_dict_turn = {}
+        if vectorized:
+            messages_entropy, words_entropy = entropy_per_turn(
+                message_list, speakers_list
+            )
+        # the per-turn counts are only kept for the saved output
+        saving = get_saving_enabled()
+        state = ParticipationState()
         output_dict_all = {}
         entropy_dict_all = {}
-        for utter_index, utter in enumerate(utterances):
+        for utter_index, (message, speaker) in enumerate(
+            zip(message_list, speakers_list)
+        ):
+            if saving or not vectorized:
+                state.add(speaker, message)
             if utter_index == 0:
                 continue
-            utterances_iter = utterances[0 : utter_index + 1]
-            # print(f"Corpus for utterances 0 - {utter_index} created successfully.")
-            #
-            disc_speakers_messages_dict_temp = {}
-            disc_number_of_messages_dict_temp = {}
-            disc_sum_number_of_words_dict_temp = {}
-
-            speakers_iter = [utt.get_speaker().id for utt in utterances_iter]
-
-            #
-            disc_speakers_messages_dict_temp[disc_id] = {
-                speaker: [] for speaker in speakers_iter
-            }
-            disc_number_of_messages_dict_temp[disc_id] = {
-                speaker: [] for speaker in speakers_iter
-            }
-            disc_sum_number_of_words_dict_temp[disc_id] = {
-                speaker: [] for speaker in speakers_iter
-            }
-
-            #
-            for utt in utterances_iter:
-                speaker = utt.get_speaker().id
-                disc_speakers_messages_dict_temp[disc_id][speaker].append(utt.text)
-            #
-            for speaker in disc_speakers_messages_dict_temp[disc_id].keys():
-                #
-                speaker_number_of_messages = len(
-                    disc_speakers_messages_dict_temp[disc_id][speaker]
-                )
-                disc_number_of_messages_dict_temp[disc_id][
-                    speaker
-                ] = speaker_number_of_messages
-                #
-                speaker_words_per_message = []
-                #
-                for message in disc_speakers_messages_dict_temp[disc_id][speaker]:
-                    #                    print('before splitting')
-                    speaker_words_per_message.append(len(message.split()))
-                #                    print('after splitting')
-                disc_speaker_number_of_words = sum(speaker_words_per_message)
-                disc_sum_number_of_words_dict_temp[disc_id][
-                    speaker
-                ] = disc_speaker_number_of_words
             key_iter = str(msgsid_list[0]) + "-" + str(msgsid_list[utter_index])
             #
-            output_dict_turn[key_iter] = {
-                "number_of_messages": list(disc_number_of_messages_dict_temp.values()),
-                "sum_of_words": list(disc_sum_number_of_words_dict_temp.values()),
-            }
-            if disc_id in output_dict_all:
-                output_dict_all[disc_id].append([output_dict_turn])
-            else:
-                output_dict_all[disc_id] = [output_dict_turn]
-
+            if saving:
+                output_dict_turn = {
+                    key_iter: {
+                        "number_of_messages": [dict(state.messages)],
+                        "sum_of_words": [dict(state.words)],
+                    }
+                }
+                if disc_id in output_dict_all:
+                    output_dict_all[disc_id].append([output_dict_turn])
+                else:
+                    output_dict_all[disc_id] = [output_dict_turn]
             #
-            entropy_per_turn = {}
-            for disc_id in disc_speakers_messages_dict_temp.keys():
-                entropy_per_turn[key_iter] = {}
-                entropy_per_turn[key_iter]["entropy_number_of_messages"] = (
-                    compute_balance(disc_number_of_messages_dict_temp[disc_id].values())
-                )
-
-                entropy_per_turn[key_iter]["entropy_number_of_words"] = compute_balance(
-                    disc_sum_number_of_words_dict_temp[disc_id].values()
-                )
+            if vectorized:
+                entropy_per_turn_iter = {
+                    key_iter: {
+                        "entropy_number_of_messages": float(
+                            messages_entropy[utter_index]
+                        ),
+                        "entropy_number_of_words": float(words_entropy[utter_index]),
+                    }
+                }
+            else:
+                entropy_per_turn_iter = {key_iter: state.entropy()}
 
             if disc_id in entropy_dict_all:
-                entropy_dict_all[disc_id].append([entropy_per_turn])
+                entropy_dict_all[disc_id].append([entropy_per_turn_iter])
             else:
-                entropy_dict_all[disc_id] = [entropy_per_turn]
+                entropy_dict_all[disc_id] = [entropy_per_turn_iter]
         save_dict_2_json(
             output_dict_all, "number_of_msgs_sumofwords_per_utt", disc_id, timestr
         )
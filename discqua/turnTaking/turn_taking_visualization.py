@@ -2,16 +2,13 @@ import io
 import os
 import sys
 import time
-from datetime import datetime
 
-import matplotlib.pyplot as plt
-from convokit import Corpus, Speaker, Utterance
-from dateutil.relativedelta import relativedelta
-
-from discqua.utils import dprint
+from discqua.utils import dprint, getCorpus, getTimestampedUtterances
 
 
 def save_stdout_to_image(func, conversation_id, *args, **kwargs):
+    import matplotlib.pyplot as plt
+
     old_stdout = sys.stdout
     sys.stdout = buffer = io.StringIO()
     try:
@@ -53,33 +50,12 @@ def make_visualization(message_list, speakers_list, msgsid_list, replyto_list, d
     """
     dprint("info", f"Building corpus of: {len(message_list)} utterances ")
 
-    speakers_unq = set(speakers_list)
-    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
-    utterances = []
-    counter = 0
+    utterances, speakers = getTimestampedUtterances(
+        message_list, speakers_list, msgsid_list, replyto_list, disc_id
+    )
     timestr = time.strftime("%Y%m%d-%H%M%S")
-    tm = datetime.strptime(timestr, "%Y%m%d-%H%M%S")
-    for utt, speaker, msg_id, rplt in zip(
-        message_list, speakers_list, msgsid_list, replyto_list
-    ):
-        tm = tm + relativedelta(seconds=1)
-        if counter == 0:
-            replyto = None
-        else:
-            replyto = str(rplt)
-        u = Utterance(
-            id=f"{msg_id}",
-            speaker=speakers[speaker],
-            conversation_id=str(disc_id),
-            reply_to=replyto,
-            text=utt,
-            meta={"timestamp": tm},
-        )
-        u.timestamp = tm
-        utterances.append(u)
-        counter += 1
 
-    corpus = Corpus(utterances=utterances)
+    corpus = getCorpus(utterances)
     dprint("info", "Corpus created successfully.")
     # corpus.print_summary_stats()
     conv0 = corpus.get_conversation(disc_id)
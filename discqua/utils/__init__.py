@@ -1,13 +1,42 @@
+from .discussion import Discussion
+from .output_spec import OutputSpec
+from .prefix_cache import static_prefix
 from .utils import (
     dprint,
     extractFeature,
+    get_model_registry,
+    get_output_path,
+    get_parse_store,
+    get_prefix_cache,
+    get_response_cache,
+    get_retry_policy,
+    get_saving_enabled,
+    get_sentiment_cache,
+    get_shared_discussion,
+    getCorpus,
     getModel,
+    getTimestampedUtterances,
     getUtterances,
     isValidResponse,
+    model_registry,
+    preloadModel,
+    prompt_batch,
     prompt_gpt4,
+    releaseModel,
     save_dict_2_json,
+    score_labels,
+    set_batch_size,
+    set_model_memory_budget,
+    set_openai_concurrency,
     set_output_path,
+    set_parse_store,
+    set_prefix_caching,
+    set_response_cache,
+    set_retry_policy,
     set_saving_enabled,
+    set_sentiment_cache,
+    set_shared_discussion,
     sleep,
     validateInputParams,
+    validateScoring,
 )
@@ -0,0 +1,198 @@
+import sys
+import threading
+import time
+from datetime import datetime
+
+from dateutil.relativedelta import relativedelta
+
+
+def build_utterances(message_list, speakers_list, disc_id, replyto_list=[]):
+    from convokit import Speaker, Utterance
+
+    if len(message_list) != len(speakers_list):
+        raise ValueError("message list and speaker list do not have the same length.")
+    speakers_unq = set(speakers_list)
+    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
+    utterances = []
+    counter = 0
+    for utt, speaker in zip(message_list, speakers_list):
+        utterances.append(
+            Utterance(
+                id=f"utt_{counter}_{disc_id}",
+                speaker=speakers[speaker],
+                conversation_id=str(disc_id),
+                reply_to=replyto_list or None,
+                text=utt,
+            )
+        )
+        counter += 1
+    return utterances, speakers
+
+
+def build_timestamped_utterances(
+    message_list, speakers_list, msgsid_list, replyto_list, disc_id
+):
+    from convokit import Speaker, Utterance
+
+    speakers_unq = set(speakers_list)
+    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
+    utterances = []
+    counter = 0
+    timestr = time.strftime("%Y%m%d-%H%M%S")
+    tm = datetime.strptime(timestr, "%Y%m%d-%H%M%S")
+    for utt, speaker, msg_id, rplt in zip(
+        message_list, speakers_list, msgsid_list, replyto_list
+    ):
+        tm = tm + relativedelta(seconds=1)
+        if counter == 0:
+            replyto = None
+        else:
+            replyto = str(rplt)
+        u = Utterance(
+            id=f"{msg_id}",
+            speaker=speakers[speaker],
+            conversation_id=str(disc_id),
+            reply_to=replyto,
+            text=utt,
+            meta={"timestamp": tm},
+        )
+        u.timestamp = tm
+        utterances.append(u)
+        counter += 1
+    return utterances, speakers
+
+
+class Discussion:
+    """A discussion normalized once, holding the convokit speakers, utterances and corpus
+    that the measures build from it. The structures are built on first use and shared by
+    every measure run on the discussion.
+
+    Args:
+        message_list (list[str]): The list of utterances in the discussion.
+        speakers_list (list[str]): The corresponding list of speakers for each utterance.
+        msgsid_list (list[str]): List of messages ids corresponding to each utterance.
+        disc_id (str): Unique identifier for the discussion.
+        replyto_list (list[str]): List indicating the message ID each utterance is replying to. Defaults to each utterance replying to the previous one.
+        conver_topic (str): The topic of conversation. Defaults to the first utterance.
+    """
+
+    def __init__(
+        self,
+        message_list,
+        speakers_list,
+        msgsid_list,
+        disc_id,
+        replyto_list=None,
+        conver_topic=None,
+    ):
+        message_list = list(message_list)
+        speakers_list = list(speakers_list)
+        msgsid_list = list(msgsid_list)
+        if replyto_list is None:
+            replyto_list = ["-"] + msgsid_list[:-1]
+        replyto_list = list(replyto_list)
+        if not (
+            len(message_list)
+            == len(speakers_list)
+            == len(msgsid_list)
+            == len(replyto_list)
+        ):
+            print(
+                "The lengths of 'message_list', 'speakers_list', 'msgsid_list' and 'replyto_list' do not match"
+            )
+            sys.exit(1)
+        if not message_list:
+            print("The discussion has no utterances")
+            sys.exit(1)
+        self.message_list = message_list
+        self.speakers_list = speakers_list
+        self.msgsid_list = msgsid_list
+        self.replyto_list = replyto_list
+        self.disc_id = disc_id
+        self.conver_topic = message_list[0] if conver_topic is None else conver_topic
+        self._structures = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_logs(cls, data):
+        """Builds a discussion from the JSON format of the example discussions, whose
+        "logs" entries are [speaker, text, model, message id]."""
+        logs = data["logs"]
+        return cls(
+            message_list=[log[1] for log in logs],
+            speakers_list=[log[0] for log in logs],
+            msgsid_list=[log[3] for log in logs],
+            disc_id=data["id"],
+            replyto_list=data.get("replyto_list"),
+            conver_topic=data.get("conver_topic"),
+        )
+
+    @classmethod
+    def coerce(cls, discussion):
+        """Returns `discussion` as a Discussion. Accepts a Discussion, a dict in the format
+        of the example discussions, or a dict of the keyword arguments of Discussion."""
+        if isinstance(discussion, cls):
+            return discussion
+        if isinstance(discussion, dict):
+            if "logs" in discussion:
+                return cls.from_logs(discussion)
+            return cls(**discussion)
+        raise TypeError(f"Cannot build a discussion from {type(discussion).__name__}")
+
+    def __len__(self):
+        return len(self.message_list)
+
+    def matches(self, message_list, speakers_list, disc_id):
+        return (
+            str(disc_id) == str(self.disc_id)
+            and _same(message_list, self.message_list)
+            and _same(speakers_list, self.speakers_list)
+        )
+
+    def _get(self, name, build):
+        with self._lock:
+            if name not in self._structures:
+                self._structures[name] = build()
+            return self._structures[name]
+
+    def utterances(self):
+        """Returns the (utterances, speakers) built by getUtterances."""
+        return self._get(
+            "utterances",
+            lambda: build_utterances(
+                self.message_list, self.speakers_list, self.disc_id
+            ),
+        )
+
+    def timestamped_utterances(self):
+        """Returns the (utterances, speakers) with message ids, reply-to links and
+        timestamps, as used by the conversation structure measures."""
+        return self._get(
+            "timestamped_utterances",
+            lambda: build_timestamped_utterances(
+                self.message_list,
+                self.speakers_list,
+                self.msgsid_list,
+                self.replyto_list,
+                self.disc_id,
+            ),
+        )
+
+    def holds(self, utterances):
+        """Returns True if `utterances` are the timestamped utterances of the discussion."""
+        built = self._structures.get("timestamped_utterances")
+        return built is not None and utterances is built[0]
+
+    def corpus(self):
+        """Returns the corpus of the timestamped utterances of the full discussion."""
+
+        def build():
+            from convokit import Corpus
+
+            return Corpus(utterances=self.timestamped_utterances()[0])
+
+        return self._get("corpus", build)
+
+
+def _same(values, reference):
+    return values is reference or list(values) == reference
@@ -0,0 +1,139 @@
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_bytes(model):
+    """Estimates the resident size of a loaded model from its parameters and buffers.
+    Pipelines and (model, tokenizer) tuples are measured through the models they hold.
+    """
+    if model is None:
+        return 0
+    if isinstance(model, (tuple, list)):
+        return sum(estimate_model_bytes(part) for part in model)
+    if hasattr(model, "model") and not hasattr(model, "parameters"):
+        return estimate_model_bytes(model.model)
+    if hasattr(model, "parameters"):
+        size = sum(p.numel() * p.element_size() for p in model.parameters())
+        if hasattr(model, "buffers"):
+            size += sum(b.numel() * b.element_size() for b in model.buffers())
+        return size
+    return 0
+
+
+def estimate_checkpoint_bytes(model_path):
+    """Estimates the resident size of a model before loading it, from the size of the
+    weight files of its local checkpoint directory. Returns None if the path is not a
+    local directory, e.g. a hub model id that is not downloaded."""
+    if not model_path or not os.path.isdir(model_path):
+        return None
+    size = 0
+    for name in os.listdir(model_path):
+        if name.endswith((".safetensors", ".bin", ".pt", ".pth")):
+            size += os.path.getsize(os.path.join(model_path, name))
+    return size or None
+
+
+class ModelRegistry:
+    """Keeps the loaded models of the process within a memory budget.
+
+    Models are kept in least recently used order. Before a model is loaded, the least
+    recently used models are evicted until its expected size fits in the budget, so that
+    the evicted models and the new one are not resident together. The expected size is
+    the size hint of the caller, or the size measured when the model was last loaded.
+    If the loaded model turns out larger, further models are evicted; the model just
+    loaded is never evicted.
+
+    Args:
+        max_bytes (int): Memory budget of the loaded models, in bytes. None for no budget. Defaults to None.
+        on_drop (callable): Called with the key and the model of every evicted or released model, to release the state derived from it. Defaults to None.
+    """
+
+    def __init__(self, max_bytes=None, on_drop=None):
+        self.max_bytes = max_bytes
+        self.on_drop = on_drop
+        self.models = OrderedDict()
+        self.info = {}
+        self.sizes = {}
+        self.lock = threading.RLock()
+
+    def get(self, key, loader, size_hint=None):
+        with self.lock:
+            if key in self.models:
+                self.models.move_to_end(key)
+                self.info[key]["hits"] += 1
+                return self.models[key]
+            expected = size_hint if size_hint is not None else self.sizes.get(key, 0)
+            self._evict(reserve=expected)
+            start = time.monotonic()
+            model = loader()
+            self.models[key] = model
+            self.info[key] = {
+                "bytes": estimate_model_bytes(model),
+                "load_seconds": time.monotonic() - start,
+                "hits": 0,
+            }
+            self.sizes[key] = self.info[key]["bytes"]
+            logger.info(
+                f"Loaded model {key} in {self.info[key]['load_seconds']:.1f}s, "
+                f"~{self.info[key]['bytes'] / 2**20:.0f} MiB"
+            )
+            self._evict(keep=key)
+            return model
+
+    def preload(self, key, loader, size_hint=None):
+        self.get(key, loader, size_hint)
+
+    def total_bytes(self):
+        return sum(info["bytes"] for info in self.info.values())
+
+    def _evict(self, keep=None, reserve=0):
+        if self.max_bytes is None:
+            return
+        for key in list(self.models):
+            if self.total_bytes() + reserve <= self.max_bytes:
+                break
+            if key != keep:
+                logger.info(f"Evicting model {key} to stay within the memory budget")
+                self._drop(key)
+        self._collect()
+
+    def _drop(self, key):
+        model = self.models.pop(key)
+        del self.info[key]
+        if self.on_drop is not None:
+            self.on_drop(key, model)
+
+    def release(self, match=None):
+        """Releases the models whose key satisfies `match`, or every model if None."""
+        with self.lock:
+            for key in list(self.models):
+                if match is None or match(key):
+                    self._drop(key)
+            self._collect()
+
+    def set_budget(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    @staticmethod
+    def _collect():
+        gc.collect()
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "total_bytes": self.total_bytes(),
+                "models": {str(key): dict(info) for key, info in self.info.items()},
+            }
@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text, as suggested by OpenAI
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class OpenAIEngine:
+    """Sends OpenAI requests from a thread pool, throttled by a requests-per-minute and a
+    tokens-per-minute token bucket that are shared by every call made through the engine.
+
+    Args:
+        max_in_flight (int): Maximum number of concurrent requests. Defaults to 8.
+        requests_per_minute (int): Request budget per minute. Defaults to 500.
+        tokens_per_minute (int): Token budget per minute, prompt plus completion tokens. Defaults to 150000.
+    """
+
+    def __init__(
+        self, max_in_flight=8, requests_per_minute=500, tokens_per_minute=150000
+    ):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+    def _throttled(self, call, prompt, max_tokens):
+        self.request_bucket.acquire(1)
+        self.token_bucket.acquire(estimate_tokens(prompt) + max_tokens)
+        return call(prompt)
+
+    def map(self, call, prompts, max_tokens=4096):
+        """Applies `call` to every prompt and returns the results in the order of the prompts.
+        Entries that are None, or whose call raised, are returned as -1."""
+        results = [-1] * len(prompts)
+        pending = [i for i, prompt in enumerate(prompts) if prompt is not None]
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = {
+                pool.submit(self._throttled, call, prompts[i], max_tokens): i
+                for i in pending
+            }
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Processing utterances"
+            ):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as ex:
+                    logger.error(f"OpenAI request for prompt {i} failed: {ex}")
+        return results
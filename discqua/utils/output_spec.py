@@ -0,0 +1,61 @@
+TEXT = "text"
+LABEL = "label"
+LABELS = "labels"
+
+# budget of a single bracketed answer, e.g. "The toxicity of the new utterance is: [3]"
+LABEL_TOKENS = 48
+
+# budget of one line of a structured label list, e.g. "- Label 12: [1]"
+LINE_TOKENS = 12
+
+
+class OutputSpec:
+    """Declares the expected size of a model answer, from which the generation budget and
+    the stop sequences of a prompt are derived.
+
+    Args:
+        kind (str): "label" for a single bracketed label, "labels" for a structured list of
+            `n_labels` bracketed labels, or "text" for free text.
+        n_labels (int): Number of lines of a "labels" answer. Defaults to 1.
+        max_tokens (int): Budget of a "text" answer. Defaults to 4096.
+    """
+
+    def __init__(self, kind=TEXT, n_labels=1, max_tokens=4096):
+        if kind not in (TEXT, LABEL, LABELS):
+            raise ValueError(f"Invalid output kind: {kind}")
+        self.kind = kind
+        self.n_labels = max(1, int(n_labels))
+        if kind == LABEL:
+            self.max_tokens = LABEL_TOKENS
+        elif kind == LABELS:
+            self.max_tokens = LINE_TOKENS * self.n_labels + LABEL_TOKENS
+        else:
+            self.max_tokens = int(max_tokens)
+
+    @classmethod
+    def text(cls, max_tokens=4096):
+        return cls(TEXT, max_tokens=max_tokens)
+
+    @classmethod
+    def label(cls):
+        return cls(LABEL)
+
+    @classmethod
+    def labels(cls, n_labels):
+        return cls(LABELS, n_labels)
+
+    @property
+    def stop(self):
+        # a single label is complete once its closing bracket is generated
+        return ["]"] if self.kind == LABEL else None
+
+    def complete(self, text):
+        """Restores the closing bracket of an answer that was cut at the stop sequence,
+        since OpenAI and llama.cpp do not return the matched stop sequence."""
+        if self.kind == LABEL and isinstance(text, str):
+            if text.rfind("[") > text.rfind("]"):
+                text += "]"
+        return text
+
+    def __repr__(self):
+        return f"OutputSpec({self.kind!r}, n_labels={self.n_labels}, max_tokens={self.max_tokens})"
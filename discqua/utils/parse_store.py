@@ -0,0 +1,48 @@
+import hashlib
+import json
+
+from .sqlite_store import SQLiteStore
+
+
+class ParseStore(SQLiteStore):
+    """Content-addressed on-disk store of the linguistic analyses of utterances (tokens,
+    POS tags and dependency parses), stored in a memory-mapped SQLite database.
+
+    Entries are keyed by a hash of the analyzer (e.g. the spaCy model and its version) and
+    the utterance text, so that an utterance is parsed once and its parse is reused by
+    every run and every measure built on the same analyzer. When the stored analyses
+    exceed `max_bytes`, the least recently used entries are evicted.
+
+    Args:
+        directory (str): Directory holding the store database. Created if missing.
+        max_bytes (int): Size budget of the stored analyses, in bytes. Defaults to 1 GiB.
+        read_only (bool): If True, the store is only read: no entries are added, evicted or touched. Defaults to False.
+    """
+
+    filename = "parses.sqlite"
+    table = "parses"
+    column = "parse"
+
+    @staticmethod
+    def make_key(analyzer, text):
+        payload = json.dumps([analyzer, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, analyzer, texts):
+        """Returns the stored analysis of each text, None for the texts not in the store."""
+        keys = [self.make_key(analyzer, text) for text in texts]
+        found = self.load(keys)
+        return [json.loads(found[key]) if key in found else None for key in keys]
+
+    def get(self, analyzer, text):
+        return self.get_many(analyzer, [text])[0]
+
+    def put_many(self, analyzer, items):
+        """Stores the analysis of each (text, analysis) pair of `items`."""
+        self.store(
+            (self.make_key(analyzer, text), json.dumps(parse, ensure_ascii=False))
+            for text, parse in items
+        )
+
+    def put(self, analyzer, text, parse):
+        self.put_many(analyzer, [(text, parse)])
@@ -0,0 +1,152 @@
+import copy
+import threading
+from collections import OrderedDict
+
+
+def static_prefix(template):
+    """Returns the part of a prompt template that precedes its first placeholder, which is
+    identical in every prompt formatted from the template."""
+    index = template.find("{")
+    return template if index < 0 else template[:index]
+
+
+class PrefixCache:
+    """Keeps the past key/values of the static prefix of prompt templates, so that the
+    prefix is prefilled once per model and template and reused for every prompt.
+
+    The prefix is located in the chat-formatted prompt, so the chat template header is part
+    of the cached tokens. The last token of the prefix is left out, since tokenization may
+    merge it with the text that follows. The entries of a model are dropped when the model
+    is released from the model registry. Since each entry holds the key/values of the whole
+    prefix on the model device, at most `max_entries` entries are kept, in least recently
+    used order.
+
+    Args:
+        max_entries (int): Maximum number of cached prefixes, over all models. Defaults to 4.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max(1, int(max_entries))
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def set_max_entries(self, max_entries):
+        with self.lock:
+            self.max_entries = max(1, int(max_entries))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def _chat_text(tokenizer, prompt):
+        return tokenizer.apply_chat_template(
+            [{"role": "user", "content": prompt}],
+            tokenize=False,
+            add_generation_prompt=True,
+        )
+
+    def _entry(self, model, text, prefix):
+        import torch
+        from transformers import DynamicCache
+
+        # chat templates may strip the whitespace around the message
+        prefix = prefix.strip()
+        start = text.find(prefix)
+        if not prefix or start < 0:
+            return None
+        prefix_text = text[: start + len(prefix)]
+        key = (model.model.name_or_path, prefix_text)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            prefix_ids = model.tokenizer(prefix_text, add_special_tokens=False)[
+                "input_ids"
+            ][:-1]
+            if not prefix_ids:
+                return None
+            cache = DynamicCache()
+            with torch.no_grad():
+                model.model(
+                    input_ids=torch.tensor([prefix_ids], device=model.model.device),
+                    past_key_values=cache,
+                    use_cache=True,
+                )
+            entry = (prefix_ids, cache)
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return entry
+
+    def discard(self, model):
+        """Drops the cached prefixes computed by `model`, e.g. once it is released."""
+        name = getattr(getattr(model, "model", None), "name_or_path", None)
+        if name is None:
+            return
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == name]:
+                del self.entries[key]
+
+    def generate(self, model, prompt, prefix, generate_kwargs):
+        """Generates the answer to `prompt` reusing the cached key/values of `prefix`.
+        Returns None if the prompt does not start with the prefix once tokenized."""
+        return self.generate_batch(model, [prompt], prefix, generate_kwargs)[0]
+
+    def generate_batch(self, model, prompts, prefix, generate_kwargs):
+        """Generates the answers to `prompts` in one batch, reusing the cached key/values of
+        `prefix` expanded across the batch. The part of each prompt that follows the prefix
+        is padded on its left, between the prefix and the text, and the padding is masked.
+        Returns None for the prompts that do not start with the prefix once tokenized."""
+        import torch
+
+        tokenizer = model.tokenizer
+        results = [None] * len(prompts)
+        texts = [self._chat_text(tokenizer, prompt) for prompt in prompts]
+        entry = self._entry(model, texts[0], prefix) if texts else None
+        if entry is None:
+            return results
+        prefix_ids, cache = entry
+        size = len(prefix_ids)
+        suffixes = {}
+        for i, text in enumerate(texts):
+            input_ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+            if input_ids[:size] == prefix_ids and len(input_ids) > size:
+                suffixes[i] = input_ids[size:]
+        if not suffixes:
+            return results
+        width = max(len(suffix) for suffix in suffixes.values())
+        pad_id = tokenizer.pad_token_id
+        if pad_id is None:
+            pad_id = tokenizer.eos_token_id
+        input_ids, attention_mask = [], []
+        for suffix in suffixes.values():
+            padding = width - len(suffix)
+            input_ids.append(prefix_ids + [pad_id] * padding + suffix)
+            attention_mask.append([1] * size + [0] * padding + [1] * len(suffix))
+        batch_cache = copy.deepcopy(cache)
+        if len(suffixes) > 1:
+            batch_cache.batch_repeat_interleave(len(suffixes))
+        device = model.model.device
+        with torch.no_grad():
+            output = model.model.generate(
+                input_ids=torch.tensor(input_ids, device=device),
+                attention_mask=torch.tensor(attention_mask, device=device),
+                past_key_values=batch_cache,
+                **generate_kwargs,
+            )
+        for row, i in enumerate(suffixes):
+            results[i] = tokenizer.decode(
+                output[row, size + width :], skip_special_tokens=True
+            )
+        return results
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
@@ -0,0 +1,39 @@
+import hashlib
+import json
+
+from .sqlite_store import SQLiteStore
+
+
+class ResponseCache(SQLiteStore):
+    """Content-addressed on-disk cache of LLM responses, stored in a SQLite database.
+
+    Entries are keyed by a hash of the formatted prompt, the model type, the model identity and
+    the decoding parameters, including the stop sequences. When the stored responses exceed
+    `max_bytes`, the least recently used entries are evicted. A missing read-only cache is
+    treated as empty.
+
+    Args:
+        directory (str): Directory holding the cache database. Created if missing.
+        max_bytes (int): Size budget of the stored responses, in bytes. Defaults to 1 GiB.
+        read_only (bool): If True, the cache is only read: no entries are added, evicted or touched. Defaults to False.
+    """
+
+    filename = "llm_responses.sqlite"
+    table = "responses"
+    column = "response"
+
+    @staticmethod
+    def make_key(prompt, model_type, model_id, max_tokens, temperature, stop=None):
+        payload = json.dumps(
+            [prompt, model_type, model_id, max_tokens, temperature, stop],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self.load([key]).get(key)
+
+    def put(self, key, response):
+        if not isinstance(response, str):
+            return
+        self.store([(key, response)])
@@ -0,0 +1,130 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+
+from .openai_engine import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# errors that will fail again however many times they are retried: bad key, missing
+# permissions, context-length or malformed requests, invalid arguments
+FATAL_ERRORS = {
+    "AuthenticationError",
+    "PermissionError",
+    "InvalidRequestError",
+    "InvalidAPIType",
+    "SignatureVerificationError",
+    "ValueError",
+    "TypeError",
+    "KeyError",
+}
+
+FATAL_STATUSES = {400, 401, 403, 404, 422}
+
+
+def retry_after(ex):
+    """Returns the delay in seconds requested by the server through the Retry-After
+    header of the error, or None if there is no such hint."""
+    headers = getattr(ex, "headers", None) or {}
+    try:
+        value = headers.get("retry-after-ms")
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value is None:
+            return None
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        # malformed hint, fall back to the computed backoff
+        return None
+    return max(0.0, date.timestamp() - time.time()) if date else None
+
+
+class RetryPolicy:
+    """Retries failed model requests with exponential backoff and full jitter.
+
+    Fatal errors (e.g. a bad key or a context-length error) fail immediately. Retries of
+    all concurrent calls draw from a shared budget, so that under sustained failures the
+    workers give up instead of retrying in lockstep. A server Retry-After hint of at
+    most `max_delay` overrides the computed delay, with up to `base_delay` of jitter added.
+    The last `max_failures` final failures are recorded in `failures` with their reason,
+    and every final failure is counted per reason in `failure_counts`.
+
+    Args:
+        max_attempts (int): Maximum number of attempts per request. Defaults to 11.
+        base_delay (float): Delay before the first retry, in seconds, doubled on every retry. Defaults to 1.
+        max_delay (float): Upper bound of the backoff delay, in seconds. Defaults to 60.
+        retries_per_minute (int): Retry budget shared by all calls. Defaults to 60.
+        max_failures (int): Number of final failures kept in `failures`. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        max_attempts=11,
+        base_delay=1.0,
+        max_delay=60.0,
+        retries_per_minute=60,
+        max_failures=1000,
+    ):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.budget = TokenBucket(retries_per_minute)
+        self.failures = deque(maxlen=max(1, int(max_failures)))
+        self.failure_counts = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_retryable(ex):
+        if type(ex).__name__ in FATAL_ERRORS:
+            return False
+        return getattr(ex, "http_status", None) not in FATAL_STATUSES
+
+    def delay(self, attempt, ex=None):
+        hint = retry_after(ex) if ex is not None else None
+        # hints beyond max_delay are ignored, and workers given the same hint are spread
+        if hint is not None and 0 < hint <= self.max_delay:
+            return hint + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _fail(self, ex, reason, attempts):
+        logger.error(f"Request failed after {attempts} attempt(s), {reason}: {ex}")
+        with self.lock:
+            self.failure_counts[reason] += 1
+            self.failures.append(
+                {
+                    "time": time.time(),
+                    "reason": reason,
+                    "error": type(ex).__name__,
+                    "message": str(ex),
+                    "attempts": attempts,
+                }
+            )
+
+    def call(self, request):
+        """Calls `request` until it succeeds and returns its result, or -1 on failure."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return request()
+            except Exception as ex:
+                if not self.is_retryable(ex):
+                    self._fail(ex, "fatal error", attempt)
+                    return -1
+                if attempt >= self.max_attempts:
+                    self._fail(ex, "attempts exhausted", attempt)
+                    return -1
+                if not self.budget.try_acquire(1):
+                    self._fail(ex, "retry budget exhausted", attempt)
+                    return -1
+                wait = self.delay(attempt - 1, ex)
+                logger.warning(f"error {ex}, retrying in {wait:.1f} seconds")
+                time.sleep(wait)
@@ -0,0 +1,59 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class SentimentCache:
+    """In-memory cache of sentiment classifier results, shared across discussions.
+
+    Entries are keyed by a hash of the model identity and the utterance text, so that an
+    utterance repeated within or across discussions is classified once. When the cache
+    holds more than `max_entries` results, the least recently used ones are evicted.
+
+    Args:
+        max_entries (int): Maximum number of cached results. Defaults to 100000.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max(1, int(max_entries))
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model_id, text):
+        payload = json.dumps([model_id, text], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model_id, text):
+        key = self.make_key(model_id, text)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return result
+
+    def put(self, model_id, text, result):
+        key = self.make_key(model_id, text)
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+            }
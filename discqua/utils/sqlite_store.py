@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class SQLiteStore:
+    """Content-addressed on-disk store of text values, kept in a memory-mapped SQLite
+    database and bounded by a size budget.
+
+    Values are keyed by a hash computed by the subclass. When the stored values exceed
+    `max_bytes`, the least recently used entries are evicted. Subclasses set the database
+    file name, the table name and the name of the value column.
+
+    Args:
+        directory (str): Directory holding the database. Created if missing.
+        max_bytes (int): Size budget of the stored values, in bytes. Defaults to 1 GiB.
+        read_only (bool): If True, the store is only read: no entries are added, evicted or touched. A missing read-only store is treated as empty. Defaults to False.
+    """
+
+    filename = "store.sqlite"
+    table = "entries"
+    column = "value"
+
+    def __init__(self, directory, max_bytes=1 << 30, read_only=False):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.read_only = bool(read_only)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        path = os.path.join(directory, self.filename)
+        if self.read_only and os.path.exists(path):
+            self.conn = sqlite3.connect(
+                f"file:{path}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            if self.read_only:
+                # a missing read-only store is an empty one
+                self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            else:
+                os.makedirs(directory, exist_ok=True)
+                self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                f"(key TEXT PRIMARY KEY, {self.column} TEXT, size INTEGER, "
+                "accessed REAL)"
+            )
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed "
+                f"ON {self.table} (accessed)"
+            )
+            self.conn.commit()
+        # reads are served from the memory-mapped database file
+        self.conn.execute(f"PRAGMA mmap_size = {self.max_bytes}")
+        self.total_bytes = self.conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()[0]
+
+    def load(self, keys):
+        """Returns a dictionary with the stored value of each of `keys` that is in the store,
+        and marks these entries as recently used."""
+        found = {}
+        with self.lock:
+            unique = list(dict.fromkeys(keys))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start : start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, {self.column} FROM {self.table} "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                found.update(rows)
+            if found and not self.read_only:
+                now = time.time()
+                self.conn.executemany(
+                    f"UPDATE {self.table} SET accessed = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self.conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def store(self, items):
+        """Stores each (key, value) pair of `items`, evicting the least recently used
+        entries if the store exceeds its size budget."""
+        if self.read_only:
+            return
+        now = time.time()
+        with self.lock:
+            for key, value in items:
+                size = len(value.encode("utf-8"))
+                previous = self.conn.execute(
+                    f"SELECT size FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                    (key, value, size, now),
+                )
+                self.total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.total_bytes -= size
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": self.total_bytes,
+        }
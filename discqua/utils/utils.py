@@ -3,10 +3,19 @@ import logging
 import os
 import re
 import sys
-import time
+import threading
 
-import openai
-from convokit import Speaker, Utterance
+from tqdm import tqdm
+
+from .discussion import build_timestamped_utterances, build_utterances
+from .model_registry import ModelRegistry, estimate_checkpoint_bytes
+from .openai_engine import OpenAIEngine
+from .output_spec import OutputSpec
+from .parse_store import ParseStore
+from .prefix_cache import PrefixCache
+from .response_cache import ResponseCache
+from .retry import RetryPolicy
+from .sentiment_cache import SentimentCache
 
 # from llama_cpp import Llama
 
@@ -15,17 +24,127 @@ _OUTPUT_PATH = os.getcwd()
 
 _ENABLE_SAVING = True
 
+_BATCH_SIZE = 8
+
+_OPENAI_ENGINE = OpenAIEngine()
+
+_RESPONSE_CACHE = None
+
+_SENTIMENT_CACHE = None
+
+_PARSE_STORE = None
+
+_RETRY_POLICY = RetryPolicy()
+
+_PREFIX_CACHE = PrefixCache()
+
+_PREFIX_CACHING = True
+
+_OPENAI_MODEL = "gpt-4-1106-preview"
+
+_MAX_TOKENS = 4096
+
+_TEXT_OUTPUT = OutputSpec.text(_MAX_TOKENS)
+
+_SHARED = threading.local()
+
 
 def set_saving_enabled(value):
     global _ENABLE_SAVING
     _ENABLE_SAVING = bool(value)
 
 
+def set_batch_size(value):
+    global _BATCH_SIZE
+    _BATCH_SIZE = max(1, int(value))
+
+
+def set_openai_concurrency(
+    max_in_flight=8, requests_per_minute=500, tokens_per_minute=150000
+):
+    global _OPENAI_ENGINE
+    _OPENAI_ENGINE = OpenAIEngine(max_in_flight, requests_per_minute, tokens_per_minute)
+
+
+def set_response_cache(directory, max_bytes=1 << 30, read_only=False):
+    global _RESPONSE_CACHE
+    if directory is None:
+        _RESPONSE_CACHE = None
+    else:
+        _RESPONSE_CACHE = ResponseCache(directory, max_bytes, read_only)
+
+
+def set_parse_store(directory, max_bytes=1 << 30, read_only=False):
+    global _PARSE_STORE
+    if directory is None:
+        _PARSE_STORE = None
+    else:
+        _PARSE_STORE = ParseStore(directory, max_bytes, read_only)
+
+
+def get_parse_store():
+    return _PARSE_STORE
+
+
+def set_sentiment_cache(max_entries=100000):
+    global _SENTIMENT_CACHE
+    if not max_entries:
+        _SENTIMENT_CACHE = None
+    else:
+        _SENTIMENT_CACHE = SentimentCache(max_entries)
+
+
+def get_sentiment_cache():
+    return _SENTIMENT_CACHE
+
+
+def set_prefix_caching(value, max_entries=None):
+    global _PREFIX_CACHING
+    _PREFIX_CACHING = bool(value)
+    if not _PREFIX_CACHING:
+        _PREFIX_CACHE.clear()
+    if max_entries is not None:
+        _PREFIX_CACHE.set_max_entries(max_entries)
+
+
+def get_prefix_cache():
+    return _PREFIX_CACHE
+
+
+def set_retry_policy(
+    max_attempts=11,
+    base_delay=1.0,
+    max_delay=60.0,
+    retries_per_minute=60,
+    max_failures=1000,
+):
+    global _RETRY_POLICY
+    _RETRY_POLICY = RetryPolicy(
+        max_attempts, base_delay, max_delay, retries_per_minute, max_failures
+    )
+
+
+def get_retry_policy():
+    return _RETRY_POLICY
+
+
+def get_response_cache():
+    return _RESPONSE_CACHE
+
+
 def set_output_path(value):
     global _OUTPUT_PATH
     _OUTPUT_PATH = value
 
 
+def get_output_path():
+    return _OUTPUT_PATH
+
+
+def get_saving_enabled():
+    return _ENABLE_SAVING
+
+
 def dprint(level="info", message=""):
     if level == "info":
         logger.info(message)
@@ -33,25 +152,69 @@ def dprint(level="info", message=""):
         logger.error(message)
 
 
+def set_shared_discussion(discussion):
+    """Shares the structures of `discussion` with the measures run in the current thread,
+    so that they are built once instead of once per measure. None stops sharing."""
+    _SHARED.discussion = discussion
+
+
+def get_shared_discussion():
+    return getattr(_SHARED, "discussion", None)
+
+
+def _shared(message_list, speakers_list, disc_id):
+    discussion = get_shared_discussion()
+    if discussion is not None and discussion.matches(
+        message_list, speakers_list, disc_id
+    ):
+        return discussion
+    return None
+
+
 def getUtterances(message_list, speakers_list, disc_id, replyto_list=[]):
-    if len(message_list) != len(speakers_list):
-        raise ValueError("message list and speaker list do not have the same length.")
-    speakers_unq = set(speakers_list)
-    speakers = {speaker: Speaker(id=speaker) for speaker in speakers_unq}
-    utterances = []
-    counter = 0
-    for utt, speaker in zip(message_list, speakers_list):
-        utterances.append(
-            Utterance(
-                id=f"utt_{counter}_{disc_id}",
-                speaker=speakers[speaker],
-                conversation_id=str(disc_id),
-                reply_to=replyto_list or None,
-                text=utt,
-            )
-        )
-        counter += 1
-    return utterances, speakers
+    discussion = _shared(message_list, speakers_list, disc_id)
+    if discussion is not None and not replyto_list:
+        return discussion.utterances()
+    return build_utterances(message_list, speakers_list, disc_id, replyto_list)
+
+
+def getTimestampedUtterances(
+    message_list, speakers_list, msgsid_list, replyto_list, disc_id
+):
+    """Builds the utterances of a discussion with their message ids, reply-to links and
+    one-second spaced timestamps, as needed by the conversation structure measures.
+
+    Args:
+        message_list (list[str]): The list of utterances in the discussion.
+        speakers_list (list[str]): The corresponding list of speakers for each utterance.
+        msgsid_list (list[str]): List of messages ids corresponding to each utterance.
+        replyto_list (list[str]): List indicating the message ID each utterance is replying to.
+        disc_id (str): Unique identifier for the discussion.
+
+    Returns:
+        tuple: The list of utterances and the dictionary of speakers by id.
+    """
+    discussion = _shared(message_list, speakers_list, disc_id)
+    if (
+        discussion is not None
+        and list(msgsid_list) == discussion.msgsid_list
+        and list(replyto_list) == discussion.replyto_list
+    ):
+        return discussion.timestamped_utterances()
+    return build_timestamped_utterances(
+        message_list, speakers_list, msgsid_list, replyto_list, disc_id
+    )
+
+
+def getCorpus(utterances):
+    """Returns the corpus of `utterances`, shared with the other measures when they are
+    the timestamped utterances of the shared discussion."""
+    from convokit import Corpus
+
+    discussion = get_shared_discussion()
+    if discussion is not None and discussion.holds(utterances):
+        return discussion.corpus()
+    return Corpus(utterances=utterances)
 
 
 def save_dict_2_json(scores_dict, file_name, conv_id, timestr):
@@ -151,6 +314,18 @@ def validateInputParams(
     return True
 
 
+def validateScoring(scoring, model_type):
+    if scoring not in ("generate", "logits"):
+        print("Expected scoring: generate or logits. Exiting")
+        sys.exit(1)
+
+    if scoring == "logits" and model_type != "transformers":
+        print("Logit-based scoring is only available for transformers models. Exiting")
+        sys.exit(1)
+
+    return True
+
+
 def sleep(model_type):
     pass
     # if model_type == "openai":
@@ -158,61 +333,349 @@ def sleep(model_type):
     # time.sleep(60)
 
 
-def prompt_gpt4(prompt, key, model_type, model):
+def _model_identity(model_type, model):
+    if model_type == "openai":
+        return _OPENAI_MODEL
+    if model_type == "transformers":
+        return model.model.name_or_path
+    return getattr(model, "model_path", type(model).__name__)
+
+
+def _decoding_temperature(model_type, model):
+    if model_type == "openai":
+        return 0
+    if model_type == "transformers":
+        config = model.model.generation_config
+        return config.temperature if config.do_sample else 0
+    return None
+
+
+def _cache_key(prompt, model_type, model, output):
+    return _RESPONSE_CACHE.make_key(
+        prompt,
+        model_type,
+        _model_identity(model_type, model),
+        output.max_tokens,
+        _decoding_temperature(model_type, model),
+        list(output.stop) if output.stop else None,
+    )
+
+
+def _cache_get(prompt, model_type, model, output):
+    if _RESPONSE_CACHE is None:
+        return None
+    return _RESPONSE_CACHE.get(_cache_key(prompt, model_type, model, output))
+
+
+def _cache_put(prompt, model_type, model, output, result):
+    if _RESPONSE_CACHE is None or result == -1:
+        return
+    _RESPONSE_CACHE.put(_cache_key(prompt, model_type, model, output), result)
+
+
+def _generate_kwargs(model, output):
+    kwargs = {"max_new_tokens": output.max_tokens}
+    if output.stop:
+        kwargs["stop_strings"] = output.stop
+        kwargs["tokenizer"] = model.tokenizer
+    return kwargs
+
+
+def _pipeline_kwargs(model, output):
+    return {"return_full_text": False, **_generate_kwargs(model, output)}
+
+
+def prompt_gpt4(prompt, key, model_type, model, output=None, prefix=None):
+    output = output or _TEXT_OUTPUT
+    cached = _cache_get(prompt, model_type, model, output)
+    if cached is not None:
+        return cached
+    return _generate(prompt, key, model_type, model, output, prefix)
+
+
+def _generate(prompt, key, model_type, model, output, prefix=None):
+    import openai
+
     openai.api_key = key
-    ok = False
-    counter = 0
-    while not ok:
-        counter = counter + 1
-        try:
-            if model_type == "openai":
-                response = openai.ChatCompletion.create(
-                    model="gpt-4-1106-preview",
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=4096,
-                    temperature=0,
-                )
-                result = response["choices"][0]["message"]["content"]
-            elif model_type.lower() == "llama":
-                messages = [{"role": "user", "content": prompt}]
-                response = model.create_chat_completion(
-                    messages=messages,
-                    max_tokens=4096,
-                )
-                result = response["choices"][0]["message"]["content"]
-                # result = llm(prompt, max_tokens=4096)
-            elif model_type == "transformers":
-                messages = [{"role": "user", "content": prompt}]
-                response = model(
-                    messages,
-                    max_new_tokens=4096,
-                    return_full_text=False,
-                )[0]["generated_text"]
-                result = response
-            else:
-                raise ValueError(
-                    # "Invalid model_type. Choose 'openai', 'llama' or 'transformers'."
-                    "Invalid model_type. Choose 'openai' or 'transformers'."
+
+    def request():
+        if model_type == "openai":
+            response = openai.ChatCompletion.create(
+                model=_OPENAI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=output.max_tokens,
+                stop=output.stop,
+                temperature=0,
+            )
+            return output.complete(response["choices"][0]["message"]["content"])
+        elif model_type.lower() == "llama":
+            messages = [{"role": "user", "content": prompt}]
+            response = model.create_chat_completion(
+                messages=messages,
+                max_tokens=output.max_tokens,
+                stop=output.stop,
+            )
+            return output.complete(response["choices"][0]["message"]["content"])
+            # result = llm(prompt, max_tokens=4096)
+        elif model_type == "transformers":
+            if prefix and _PREFIX_CACHING:
+                response = _PREFIX_CACHE.generate(
+                    model, prompt, prefix, _generate_kwargs(model, output)
                 )
-            ok = True
-        except Exception as ex:
-            print("error", ex)
-            print("sleep for 5 seconds")
-            time.sleep(5)
-            if counter > 10:
-                return -1
+                if response is not None:
+                    return response
+            messages = [{"role": "user", "content": prompt}]
+            response = model(messages, **_pipeline_kwargs(model, output))[0][
+                "generated_text"
+            ]
+            return response
+        else:
+            raise ValueError(
+                # "Invalid model_type. Choose 'openai', 'llama' or 'transformers'."
+                "Invalid model_type. Choose 'openai' or 'transformers'."
+            )
+
+    result = _RETRY_POLICY.call(request)
+    _cache_put(prompt, model_type, model, output, result)
     return result
 
 
-_cached_models = {}
+def prompt_batch(
+    prompts, key, model_type, model, batch_size=None, output=None, prefix=None
+):
+    """Prompts the language model with all the prompts of a discussion as a group.
+
+    For the transformers backend the prompts are sorted by length, split into buckets of
+    `batch_size` and each bucket is generated with a single padded pipeline call, so that
+    prompts of similar length are padded together. For the openai backend the prompts are
+    sent concurrently, as configured by set_openai_concurrency. The llama backend prompts
+    one by one. If the prompts share the static `prefix` of their template and prefix
+    caching is enabled, the transformers backend prefills the prefix once per model and
+    template and generates each bucket from its cached key/values, expanded across the
+    bucket. If a response cache is set with set_response_cache, cached prompts are
+    answered from it and only the remaining prompts are sent to the model.
+
+    Args:
+        prompts (list[str]): The formatted prompts. Entries that are None are not sent to the model.
+        key (str): OpenAI API key, required if using OpenAI-based models.
+        model_type (str): Language model type to use, either "openai" or "transformers".
+        model: The loaded model, as returned by getModel.
+        batch_size (int): Number of prompts generated per pipeline call. Defaults to the value of set_batch_size.
+        output (OutputSpec): Expected size of the answers, from which the generation budget and stop sequences are derived. Defaults to free text.
+        prefix (str): Text shared by the start of every prompt, as returned by static_prefix. Defaults to None.
+
+    Returns:
+        list: The model responses in the order of the prompts, -1 for failed or missing prompts.
+    """
+    output = output or _TEXT_OUTPUT
+    results = [-1] * len(prompts)
+    pending = []
+    for i, prompt in enumerate(prompts):
+        if prompt is None:
+            continue
+        cached = _cache_get(prompt, model_type, model, output)
+        if cached is not None:
+            results[i] = cached
+        else:
+            pending.append(i)
+
+    if model_type == "openai":
+        responses = _OPENAI_ENGINE.map(
+            lambda prompt: _generate(prompt, key, model_type, model, output),
+            [prompts[i] for i in pending],
+            max_tokens=output.max_tokens,
+        )
+        for i, response in zip(pending, responses):
+            results[i] = response
+        return results
+    batch_size = batch_size or _BATCH_SIZE
+    if model_type != "transformers" or batch_size == 1:
+        for i in tqdm(pending, desc="Processing utterances"):
+            results[i] = _generate(prompts[i], key, model_type, model, output, prefix)
+        return results
+
+    tokenizer = model.tokenizer
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    pending.sort(key=lambda i: len(prompts[i]))
+    buckets = [
+        pending[start : start + batch_size]
+        for start in range(0, len(pending), batch_size)
+    ]
+    for bucket in tqdm(buckets, desc="Processing utterance batches"):
+        try:
+            responses = _generate_bucket(
+                [prompts[i] for i in bucket], model, output, prefix
+            )
+            for i, response in zip(bucket, responses):
+                results[i] = response
+                _cache_put(prompts[i], model_type, model, output, results[i])
+        except Exception as ex:
+            dprint("error", f"Batched generation failed, prompting one by one: {ex}")
+            for i in bucket:
+                results[i] = _generate(prompts[i], key, model_type, model, output)
+    return results
+
+
+def _generate_bucket(prompts, model, output, prefix=None):
+    responses = [None] * len(prompts)
+    if prefix and _PREFIX_CACHING:
+        responses = _PREFIX_CACHE.generate_batch(
+            model, prompts, prefix, _generate_kwargs(model, output)
+        )
+    rest = [i for i, response in enumerate(responses) if response is None]
+    if rest:
+        outputs = model(
+            [[{"role": "user", "content": prompts[i]}] for i in rest],
+            batch_size=len(rest),
+            **_pipeline_kwargs(model, output),
+        )
+        for i, generated in zip(rest, outputs):
+            responses[i] = generated[0]["generated_text"]
+    return responses
+
+
+def _label_tokens(tokenizer, answer_prefix, labels):
+    """Returns the part of the answer prefix that precedes the label tokens and the token
+    of each label. If the tokenizer merges the end of the prefix with the labels (e.g. "[1"
+    as a single token), the merged characters are moved from the prefix to the labels.
+    Raises ValueError if the labels cannot be told apart by a single token."""
+    for cut in range(len(answer_prefix) + 1):
+        context = answer_prefix[: len(answer_prefix) - cut]
+        context_ids = tokenizer.encode(context, add_special_tokens=False)
+        candidate_ids = []
+        for label in labels:
+            ids = tokenizer.encode(answer_prefix + label, add_special_tokens=False)
+            if (
+                ids[: len(context_ids)] != context_ids
+                or len(ids) != len(context_ids) + 1
+            ):
+                break
+            candidate_ids.append(ids[-1])
+        else:
+            if len(set(candidate_ids)) == len(labels):
+                return context, candidate_ids
+    raise ValueError(
+        f"The labels {labels} are not single tokens after the answer prefix {answer_prefix!r}"
+    )
+
+
+def score_labels(prompts, model, answer_prefix, labels, batch_size=None):
+    """Scores the candidate labels of a rating prompt with a single forward pass, instead of
+    generating the answer.
+
+    Each prompt is followed by the fixed answer prefix (e.g. "The toxicity of the new
+    utterance is: [") and the next-token probabilities of the candidate labels are read
+    from the logits of the last position. The prompts are scored in length-sorted batches.
+
+    Args:
+        prompts (list[str]): The formatted prompts. Entries that are None are not scored.
+        model: The loaded transformers pipeline, as returned by getModel.
+        answer_prefix (str): The start of the expected answer, up to the label.
+        labels (list[str]): The candidate numeric labels, e.g. ["1", "2", "3"].
+        batch_size (int): Number of prompts per forward pass. Defaults to the value of set_batch_size.
+
+    Returns:
+        list: For each prompt, -1 if it is missing or failed, otherwise a dictionary with the
+        answer of the most probable label ("response"), the expected value of the label
+        ("expected") and the probability of each label ("probs").
+    """
+    import torch
+
+    tokenizer = model.tokenizer
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+
+    context, candidate_ids = _label_tokens(tokenizer, answer_prefix, labels)
+    values = [float(label) for label in labels]
+
+    batch_size = batch_size or _BATCH_SIZE
+    results = [-1] * len(prompts)
+    texts = {}
+    for i, prompt in enumerate(prompts):
+        if prompt is None:
+            continue
+        texts[i] = (
+            tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}],
+                tokenize=False,
+                add_generation_prompt=True,
+            )
+            + context
+        )
+    pending = sorted(texts, key=lambda i: len(texts[i]))
+    buckets = [
+        pending[start : start + batch_size]
+        for start in range(0, len(pending), batch_size)
+    ]
+    for bucket in tqdm(buckets, desc="Scoring utterance batches"):
+        try:
+            inputs = tokenizer(
+                [texts[i] for i in bucket],
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False,
+            ).to(model.model.device)
+            position_ids = (inputs["attention_mask"].cumsum(-1) - 1).clamp(min=0)
+            with torch.no_grad():
+                logits = model.model(**inputs, position_ids=position_ids).logits
+            probs = torch.softmax(logits[:, -1, candidate_ids].float(), dim=-1)
+        except Exception as ex:
+            dprint("error", f"Label scoring failed: {ex}")
+            continue
+        for i, p in zip(bucket, probs.tolist()):
+            best = max(range(len(labels)), key=p.__getitem__)
+            results[i] = {
+                "response": answer_prefix + labels[best] + "]",
+                "expected": sum(v * q for v, q in zip(values, p)),
+                "probs": dict(zip(labels, p)),
+            }
+    return results
+
+
+# the cached prefixes hold key/values computed by the models and are dropped with them
+model_registry = ModelRegistry(
+    on_drop=lambda key, model: _PREFIX_CACHE.discard(model)
+)
+
+
+def set_model_memory_budget(max_bytes):
+    model_registry.set_budget(max_bytes)
+
+
+def get_model_registry():
+    return model_registry
 
 
 def getModel(model_path, gpu, model_type="transformers", device="auto"):
     key = (model_path, model_type, device, gpu)
-    if key in _cached_models:
-        dprint("info", " Using cached model for: {key}")
-        return _cached_models[key]
+    size_hint = (
+        estimate_checkpoint_bytes(model_path) if model_type == "transformers" else None
+    )
+    return model_registry.get(
+        key, lambda: _loadModel(model_path, gpu, model_type, device), size_hint
+    )
+
+
+def preloadModel(model_path, gpu, model_type="transformers", device="auto"):
+    """Loads a model into the model registry ahead of its first use."""
+    getModel(model_path, gpu, model_type, device)
+
+
+def releaseModel(model_path=None, model_type=None):
+    """Releases the loaded models matching `model_path` and `model_type`; None matches any."""
+
+    def match(key):
+        return (model_path is None or key[0] == model_path) and (
+            model_type is None or key[1] == model_type
+        )
+
+    model_registry.release(match)
+
 
+def _loadModel(model_path, gpu, model_type, device):
     if model_type == "controversy":
         from transformers import pipeline
 
@@ -221,7 +684,6 @@ def getModel(model_path, gpu, model_type="transformers", device="auto"):
             model="nlptown/bert-base-multilingual-uncased-sentiment",
             device_map=device,
         )
-        _cached_models[key] = pipe
         return pipe
 
     if model_type == "echo":
@@ -234,7 +696,6 @@ def getModel(model_path, gpu, model_type="transformers", device="auto"):
         model = PeftModel.from_pretrained(model, adapter_model)
         tokenizer = AutoTokenizer.from_pretrained(base_model)
         model = model.to(device)
-        _cached_models[key] = (model, tokenizer)
         return (model, tokenizer)
     if model_type == "transformers":
         import transformers
@@ -246,7 +707,6 @@ def getModel(model_path, gpu, model_type="transformers", device="auto"):
         generator = transformers.pipeline(
             "text-generation", model=model, tokenizer=tokenizer
         )
-        _cached_models[key] = generator
         return generator
     print("MODEL NOT FOUND")
     sys.exit(1)
@@ -255,5 +715,4 @@ def getModel(model_path, gpu, model_type="transformers", device="auto"):
     #    n_gpu_layers=50 if gpu else 0,
     #    n_ctx=4096 * 2,
     # )
-    # _cached_models[key] = llm
     # return llm